@@ -1,7 +1,8 @@
 """Sondra's JSON API Services."""
-import json
+from functools import partial
+from itertools import chain
 from textwrap import dedent
-from urllib.parse import urlencode
+from urllib.parse import urlencode, urlparse, urlunparse, parse_qsl
 
 import jsonschema
 import rethinkdb
@@ -10,6 +11,8 @@ from sondra.api.query_set import QuerySet
 from sondra.api.ref import Reference
 
 from sondra import formatters
+from sondra.document import signals as doc_signals
+from sondra.document.dereference import foreign_key_properties
 from sondra.api.expose import method_schema
 from sondra.exceptions import ValidationError
 
@@ -21,9 +24,20 @@ class APIRequest(object):
     formats = {
         'help': formatters.Help(),
         'json': formatters.JSON(),
+        'ndjson': formatters.NDJSON(),
         'html': formatters.HTML(),
         'schema': formatters.Schema(),
-        'geojson': formatters.GeoJSON()
+        'geojson': formatters.GeoJSON(),
+        'msgpack': formatters.MessagePack(),
+        'cbor': formatters.CBOR(),
+        'arrow': formatters.Arrow(),
+        'parquet': formatters.Parquet(),
+    }
+    body_formats = {
+        'application/msgpack': 'msgpack',
+        'application/x-msgpack': 'msgpack',
+        'application/vnd.msgpack': 'msgpack',
+        'application/cbor': 'cbor',
     }
     DEFAULT_FORMAT = 'json'
 
@@ -64,6 +78,7 @@ class APIRequest(object):
         self.formatter_kwargs = {}
         self.query = None
         self.additional_filters = []
+        self.response_headers = {}
 
         self.reference = Reference(
             self.suite,
@@ -122,16 +137,26 @@ class APIRequest(object):
             return self.formats[format](self.reference, self.reference.value, **self.formatter_kwargs)
 
 
+    def _content_type(self):
+        """The media type of the request body, without parameters."""
+        content_type = self.headers.get('Content-Type') if self.headers else None
+        return content_type.split(';')[0].strip().lower() if content_type else None
+
     def _parse_query(self):
         self.formatter_kwargs = self.reference.kwargs
         if 'format' in self.formatter_kwargs:
             del self.formatter_kwargs['format']
 
+        # stream collection results straight from the cursor instead of building the whole response.
+        stream = self.formatter_kwargs.pop('stream', 'false').lower() != 'false'
+        self.stream = self.reference.format in {'ndjson', 'arrow', 'parquet'} or \
+            (stream and self.reference.format in {'json', 'msgpack', 'cbor'})
+
         self.objects = []
 
         if self.query_params:
             if '__objs' in self.query_params:
-                self.objects = json.loads(self.query_params['__objs'])
+                self.objects = self.suite.json_codec.loads(self.query_params['__objs'])
                 if isinstance(self.objects, dict):
                     self.objects = [self.objects]
 
@@ -154,10 +179,11 @@ class APIRequest(object):
                 self.api_arguments[k] = v
 
         if self.body:
-            if isinstance(self.body, bytes):
-                body_args = json.loads(self.body.decode('utf-8'))
-            elif isinstance(self.body, str):
-                body_args = json.loads(self.body)
+            body_format = self.body_formats.get(self._content_type())
+            if body_format is not None:
+                body_args = self.formats[body_format].loads(self.body)
+            elif isinstance(self.body, (bytes, str)):
+                body_args = self.suite.json_codec.loads(self.body)
             else:
                 body_args = self.body
 
@@ -178,6 +204,11 @@ class APIRequest(object):
         self.durability = self.api_arguments.get('durability', 'hard')
         self.return_changes = self.api_arguments.get('return_changes', 'false').lower() != 'false'
         self.dereference = self.api_arguments.get('dereference', 'false').lower() != 'false'
+        if self.dereference and self.request_method == 'GET' and self.reference.kind in {'collection', 'document'}:
+            # embed every referenced document, using the same batched lookup as the fetch formatter option
+            fk_properties = foreign_key_properties(self.reference.get_collection().document_class)
+            if fk_properties and 'fetch' not in self.formatter_kwargs:
+                self.formatter_kwargs['fetch'] = ','.join(fk_properties)
         self.delete_all = self.api_arguments.get('delete_all', 'false').lower() != 'false'
         self.conflict = self.api_arguments.get('conflict', {
             'POST': "error",
@@ -186,21 +217,23 @@ class APIRequest(object):
         }.get(self.request_method, 'error'))
 
     def validate(self):
+        if self.request_method == 'PATCH' and self.reference.kind in {'collection', 'document'}:
+            return  # patches are validated property by property as they're applied. see Collection.patch
+
         target = self.reference.value
 
         if self.reference.kind.endswith('method'):
-            schema = method_schema(*target)['definitions']['method_request']
-        elif self.reference.kind in ['collection', 'application']:
-            schema = target.schema
+            validator = self.suite.method_request_validator(*target)
+        elif self.reference.kind == 'collection':
+            validator = target.schema_validator
+        elif self.reference.kind == 'application':
+            validator = partial(jsonschema.validate, schema=target.schema)
         else:
-            schema = target.collection.schema
+            validator = target.collection.schema_validator
 
-        if self.request_method != 'PATCH':
-            for object in self.objects:
-                if not isinstance(object, str):
-                    jsonschema.validate(object, schema)
-        else:
-            pass  # TODO validate individual keys
+        for object in self.objects:
+            if not isinstance(object, str):
+                validator(object)
 
     def method_call(self):
         instance, method = self.reference.value
@@ -233,19 +266,33 @@ class APIRequest(object):
         if self.reference.format in {'schema', 'help'}:
             return coll
 
-        qs = QuerySet(coll)
-        q = qs.get_query(self.api_arguments, self.objects)
-        for f in self.additional_filters:
-            q = q.filter(f)
+        # a stream holds no results in memory, so needn't page, but is still capped unless the collection opts out
+        max_size = None if coll.unlimited_streams or not self.stream else coll.max_page_size
+        qs = QuerySet(coll, paginate=not self.stream, max_size=max_size)
+        q = qs.get_query(self.api_arguments, self.objects, additional_filters=self.additional_filters)
 
         if qs.use_raw_results:
-            results = q.run(coll.application.connection)
+            results = coll.application.run(q)
             try:
                 return [x for x in results]
             except:
                 return {"_": results}
+        elif self.stream:
+            results = coll.q(q, partial=qs.partial)
+            first = next(results, None)  # run the query now, so errors are reported before the response starts
+            return chain([first], results) if first is not None else iter(())
         else:
-            return [x for x in coll.q(q)]
+            results, next_page = qs.page(coll.q(q, partial=qs.partial), self.api_arguments)
+            if next_page is not None:
+                self.response_headers['Link'] = '<{0}>; rel="next"'.format(self.page_url(next_page))
+            return results
+
+    def page_url(self, page_arguments):
+        """The URL of this request with its paging arguments replaced."""
+        url = urlparse(self.reference.url.replace("@!", "#"))
+        query = [(k, v) for k, v in parse_qsl(url.query) if k not in {'start', 'end', 'after', 'limit'}]
+        query.extend(sorted(page_arguments.items()))
+        return urlunparse(url._replace(query=urlencode(query)))
 
     def add_collection_items(self):
         coll = self.reference.get_collection()
@@ -255,16 +302,7 @@ class APIRequest(object):
 
     def update_collection_items(self):
         coll = self.reference.get_collection()
-        docs = []
-        for k, updates in self.objects:
-            doc = coll[k]
-            for prop, value in updates.items():
-                doc[prop] = value
-
-            docs.append(doc)
-
-        ret = coll.save(docs, conflict=self.conflict, durability=self.durability, return_changes=self.return_changes)
-        return ret
+        return coll.patch_many(self.objects, durability=self.durability, return_changes=self.return_changes)
 
     def replace_collection_items(self):
         coll = self.reference.get_collection()
@@ -281,17 +319,14 @@ class APIRequest(object):
         coll = self.reference.get_collection()
 
         qs = QuerySet(coll)
-        q = qs.get_query(self.api_arguments, self.objects)
-        for f in self.additional_filters:
-            q = q.filter(f)
+        q = qs.get_query(self.api_arguments, self.objects, additional_filters=self.additional_filters)
 
-        print("Delete collection items")
-        print(q)
         if not self.delete_all and not qs.is_restricted(self.api_arguments, self.objects):
             raise PermissionError("Cannot delete all collection items without a specific request.")
 
-        print([x for x in q.run(coll.application.connection)])
-        return q.delete(durability=self.durability, return_changes=self.return_changes).run(coll.application.connection)
+        ret = coll.application.run(q.delete(durability=self.durability, return_changes=self.return_changes))
+        doc_signals.post_delete.send(coll.document_class, collection=coll, keys=None, results=ret)
+        return ret
 
     def get_document(self):
         doc = self.reference.get_document()
@@ -306,15 +341,11 @@ class APIRequest(object):
         return ret
 
     def update_document(self):
-        doc = self.reference.get_document()
         coll = self.reference.get_collection()
+        patch = {}
         for obj in self.objects:
-            if coll.primary_key in obj:
-                del obj[coll.primary_key]
-            for k, v in obj.items():
-                doc[k] = v
-        ret = doc.save(conflict='replace', durability=self.durability, return_changes=self.return_changes)
-        return ret
+            patch.update((k, v) for k, v in obj.items() if k != coll.primary_key)
+        return coll.patch(self.reference.doc, patch, durability=self.durability, return_changes=self.return_changes)
 
     def delete_document(self):
         doc = self.reference.get_document()
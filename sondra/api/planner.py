@@ -0,0 +1,174 @@
+"""Use secondary indexes to satisfy API filter specifications.
+
+Every ``flt`` clause used to become a ``filter()``, which scans the whole table. The :class:`FilterPlanner` looks for
+an index that covers some of the clauses, and turns those into a ``get_all()`` or ``between()`` on the index. Whatever
+clauses are left over are still applied with ``filter()``.
+"""
+import rethinkdb as r
+
+
+class IndexPlan(object):
+    """A way of using one index to satisfy some filter clauses.
+
+    Attributes:
+        index (str): The name of the index.
+        fields (tuple): The properties the index covers.
+        equalities (list): Values for the leading index fields that are compared for equality.
+        lower (tuple): ``(value, inclusive)`` for a lower bound on the next field, or None.
+        upper (tuple): ``(value, inclusive)`` for an upper bound on the next field, or None.
+        clauses (list): The filter clauses this plan satisfies.
+        is_primary (bool): True if the index is the primary key.
+    """
+    def __init__(self, index, fields, equalities, lower, upper, clauses, is_primary=False):
+        self.index = index
+        self.fields = fields
+        self.equalities = equalities
+        self.lower = lower
+        self.upper = upper
+        self.clauses = clauses
+        self.is_primary = is_primary
+
+    @property
+    def is_exact(self):
+        """True if every field of the index is compared for equality, so ``get_all()`` can be used."""
+        return len(self.equalities) == len(self.fields)
+
+    @property
+    def score(self):
+        """Plans with higher scores are expected to be more selective.
+
+        Without statistics, the best guess is that the primary key is unique, that matching more fields exactly
+        narrows the results the most, and that a range narrows them more than nothing.
+        """
+        return (
+            self.is_exact and self.is_primary,
+            len(self.equalities),
+            (self.lower is not None) + (self.upper is not None),
+            self.is_exact,
+            -len(self.fields),
+        )
+
+    def _key(self, value, pad):
+        if len(self.fields) == 1:
+            return value
+        rest = len(self.fields) - len(self.equalities) - 1
+        return list(self.equalities) + [value] + [pad] * rest
+
+    def bounds(self):
+        """The ``between()`` range of index keys that satisfies this plan's clauses.
+
+        Returns:
+            (left, right, left_bound, right_bound): Arguments for ``between()``.
+        """
+        if self.is_exact:
+            key = self.equalities[0] if len(self.fields) == 1 else list(self.equalities)
+            return key, key, 'closed', 'closed'
+
+        if self.lower is None:
+            left, left_bound = self._key(r.minval, r.minval), 'closed'
+        elif self.lower[1]:
+            left, left_bound = self._key(self.lower[0], r.minval), 'closed'
+        else:
+            left, left_bound = self._key(self.lower[0], r.maxval), 'open'
+
+        if self.upper is None:
+            right, right_bound = self._key(r.maxval, r.maxval), 'closed'
+        elif self.upper[1]:
+            right, right_bound = self._key(self.upper[0], r.maxval), 'closed'
+        else:
+            right, right_bound = self._key(self.upper[0], r.minval), 'open'
+
+        return left, right, left_bound, right_bound
+
+    def apply(self, table, ordered=False):
+        """Return a query selecting from ``table`` with this plan.
+
+        Args:
+            table: The table to select from.
+            ordered (bool=False): The results will be ordered by this plan's index. ``order_by(index=...)`` can't
+              follow ``get_all()``, so exact plans select with a ``between()`` that starts and ends on the key instead.
+        """
+        if self.is_exact and not ordered:
+            key = self.equalities[0] if len(self.fields) == 1 else list(self.equalities)
+            return table.get_all(key, index=self.index)
+
+        left, right, left_bound, right_bound = self.bounds()
+        return table.between(left, right, index=self.index, left_bound=left_bound, right_bound=right_bound)
+
+    def __str__(self):
+        clauses = ' and '.join('{0} {1} {2!r}'.format(c['lhs'], c.get('op', '=='), c['rhs']) for c in self.clauses)
+        return '{0} on index {1} {2} for {3}'.format(
+            'get_all' if self.is_exact else 'between', self.index, self.fields, clauses)
+
+
+class FilterPlanner(object):
+    """Choose an index for a list of API filter clauses.
+
+    Only plain comparisons (``==``, ``<``, ``<=``, ``>``, ``>=``) can use an index, and only when the clause doesn't
+    set ``default``, since an index never contains documents that are missing the field.
+
+    Args:
+        coll (sondra.collection.Collection): The collection being queried.
+    """
+    RANGE_OPS = {'<', '<=', '>', '>='}
+
+    def __init__(self, coll):
+        self.coll = coll
+
+    def plan(self, clauses, ordering_index=None):
+        """Find the most selective index plan for a list of clauses.
+
+        Args:
+            clauses (list): Filter clauses, as dicts with ``lhs``, ``op``, and ``rhs``.
+            ordering_index (str): If the results will be ordered by an index, a plan on that index is chosen whenever
+              the clauses use it, since ``order_by(index=...)`` can follow it; apply it with ``ordered=True``. If they
+              don't, the plan may be on another index, after which the results have to be sorted in memory.
+
+        Returns:
+            (IndexPlan or None, list): The chosen plan, and the clauses it doesn't satisfy.
+        """
+        candidates = []
+        for index, fields in self.coll.index_fields().items():
+            plan = self._plan_for_index(index, fields, clauses)
+            if plan is not None:
+                candidates.append(plan)
+
+        if ordering_index is not None:
+            candidates = [p for p in candidates if p.index == ordering_index] or candidates
+
+        if not candidates:
+            return None, list(clauses)
+
+        best = max(candidates, key=lambda p: p.score)
+        used = set(id(c) for c in best.clauses)
+        return best, [c for c in clauses if id(c) not in used]
+
+    def _plan_for_index(self, index, fields, clauses):
+        usable = [c for c in clauses if not c.get('default', False) and 'lhs' in c]
+        used = []
+        equalities = []
+        for field in fields:
+            clause = next((c for c in usable if c['lhs'] == field and c.get('op', '==') == '=='), None)
+            if clause is None:
+                break
+            equalities.append(clause['rhs'])
+            used.append(clause)
+
+        lower = upper = None
+        if len(equalities) < len(fields):
+            field = fields[len(equalities)]
+            for c in usable:
+                op = c.get('op', '==')
+                if c['lhs'] != field or op not in self.RANGE_OPS:
+                    continue
+                if op in {'>', '>='} and lower is None:
+                    lower = (c['rhs'], op == '>=')
+                    used.append(c)
+                elif op in {'<', '<='} and upper is None:
+                    upper = (c['rhs'], op == '<=')
+                    used.append(c)
+
+        if not used:
+            return None
+
+        return IndexPlan(index, fields, equalities, lower, upper, used, is_primary=index == self.coll.primary_key)
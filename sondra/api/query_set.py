@@ -1,13 +1,45 @@
+import base64
 import json
+from datetime import datetime, timezone
+
+import jsonschema
 import rethinkdb as r
 
+from sondra.api.planner import FilterPlanner
+from sondra.collection.query_set import projection
+from sondra.document.schema_parser import DateTime
 from sondra.exceptions import ValidationError
 
+
+def _token_default(obj):
+    if isinstance(obj, datetime):
+        if obj.tzinfo is None:
+            obj = obj.replace(tzinfo=timezone.utc)
+        return {'$reql_type$': 'TIME', 'epoch_time': obj.timestamp(), 'timezone': '+00:00'}
+    raise TypeError("Type not serializable")
+
+
 class QuerySet(object):
     """
     Limit the objects we are targeting in an API request
+
+    Args:
+        coll (sondra.collection.Collection): The collection being queried.
+        paginate (bool=False): Return results a page at a time. The page size is the ``limit`` argument, or the
+          collection's ``page_size``, and never more than its ``max_page_size``. Results ordered by an index are paged
+          with ``after`` tokens, which continue from the last document of the previous page instead of skipping over
+          every page before it. Tokens break ties on the index by primary key, so results ordered by an index *and*
+          ``order_by`` properties (which break the ties instead) fall back on ``start``, as do all other results.
+          Results with no ordering are ordered by the index that serves the filter, or else by primary key.
+        max_size (int): Without ``paginate``, never return more than this many results. None means no limit.
+
+    Attributes:
+        plan (sondra.api.planner.IndexPlan): The index plan used for the filter, if any.
+        page_size (int): The number of results in a page, or None if results aren't paginated.
+        page_index (str): The index pages are ordered by, or None if pages use ``start`` instead of ``after``.
+        partial (bool): True if the query returns only some properties of each document, because of a ``fields`` or
+          ``without`` argument. Pass it on to :meth:`sondra.collection.Collection.q`.
     """
-    MAX_RESULTS = 100
     SAFE_OPS = {
         'with_fields',
         'count',
@@ -30,9 +62,19 @@ class QuerySet(object):
         'get_nearest',
     }
 
-    def __init__(self, coll):
+    def __init__(self, coll, paginate=False, max_size=None):
         self.coll = coll
+        self.paginate = paginate
+        self.max_size = max_size
         self.use_raw_results = False
+        self.plan = None
+        self.page_size = None
+        self.page_index = None
+        self.ordering_index = None
+        self.ordering_fields = ()
+        self.partial = False
+        self._page_filter = None
+        self._index_for = None  # the properties an ordering index was picked for, if the request didn't name it
 
     def is_restricted(self, api_arguments, objects=None):
         """
@@ -44,40 +86,219 @@ class QuerySet(object):
         """
         return objects or api_arguments.get('flt', None) or api_arguments.get('geo', None)
 
-    def get_query(self, api_arguments, objects=None):
+    def get_query(self, api_arguments, objects=None, additional_filters=()):
         """
         Apply all filters in turn and return a ReQL query.
 
-        :param api_arguments: flt, geo, agg, start, end, limit filters
+        :param api_arguments: flt, geo, agg, start, end, limit, after filters, and fields or without projections
         :param objects: A list of object IDs.
+        :param additional_filters: ReQL filters to apply along with ``flt``, such as those added by request processors.
         :return:
         """
+        flt = self._filter_clauses(api_arguments)
+        self.ordering_index, self.ordering_fields = self._ordering(api_arguments)
+        if self.paginate and 'agg' not in api_arguments:  # aggregations return a single result
+            self.page_size = self._page_size(api_arguments)
+
         q = self.coll.table
 
         q = self._handle_keys(api_arguments, q)
-        q = self._handle_simple_filters(api_arguments, q)
         q = self._handle_spatial_filters(self.coll, api_arguments, q)
-        q = self._apply_ordering(api_arguments, q)
+        q, flt = self._handle_indexed_filters(api_arguments, flt, q)
+        q = self._apply_index_ordering(q)
+        q = self._handle_simple_filters(flt, q)
+        for f in additional_filters:
+            q = q.filter(f)
+        q = self._apply_ordering(q)
+        q = self._handle_projection(api_arguments, q)
         q = self._handle_aggregations(api_arguments, q)
         q = self._handle_limits(api_arguments, q)
         return q
 
     def __call__(self, api_arguments, objects=None):
         q = self.get_query(api_arguments, objects)
-        return self.coll.q(q)
-
-    def _apply_ordering(self, api_arguments, q):
-        if 'order_by_index' in api_arguments:
-            q = q.order_by(index=api_arguments['order_by_index'])
-        if 'order_by' in api_arguments:
-            if isinstance(api_arguments['order_by'], list):
-                ordering = api_arguments['order_by']
-            else:
-                ordering = (api_arguments['order_by'],)
-            q = q.order_by(*ordering)
+        return self.coll.q(q, partial=self.partial)
+
+    def page(self, results, api_arguments):
+        """
+        Cut the results of a paginated query down to a page.
+
+        Args:
+            results (iterable): The results of running the query from :meth:`get_query`.
+            api_arguments (dict): The same arguments passed to :meth:`get_query`.
+
+        Returns:
+            (list, dict): The page of results, and the API arguments that fetch the next page, or None if this is the
+              last page.
+        """
+        results = list(results)
+        if self.page_size is None or len(results) <= self.page_size:  # the query asks for one extra result
+            return results, None
+
+        results = results[:self.page_size]
+        if self.page_index is not None:
+            return results, {'after': self.page_token(results[-1]), 'limit': self.page_size}
+        else:
+            return results, {'start': self._integer(api_arguments, 'start', 0) + self.page_size, 'limit': self.page_size}
+
+    def page_token(self, doc):
+        """
+        Make an opaque token that continues a query from just after a document.
+
+        Args:
+            doc (sondra.document.Document): The last document in a page.
+
+        Returns:
+            str: The value to pass as the ``after`` argument. Dates are stored as strings in documents but as times
+              in the database, so they are encoded as ReQL times.
+        """
+        fields = self.coll.index_fields()[self.page_index]
+        values = [doc[f] if isinstance(doc.specials.get(f), DateTime) else doc.obj.get(f) for f in fields]
+        key = values[0] if len(values) == 1 else values
+        token = json.dumps([self.page_index, key, doc.id], default=_token_default)
+        return base64.urlsafe_b64encode(token.encode('utf-8')).decode('ascii')
+
+    def _read_page_token(self, token):
+        try:
+            index, key, pk = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+        except (ValueError, TypeError):
+            raise jsonschema.ValidationError("Invalid page token.")
+        if index != self.page_index:
+            raise jsonschema.ValidationError("Page token doesn't match the ordering of the query.")
+        return key, pk
+
+    def _filter_clauses(self, api_arguments):
+        if 'flt' not in api_arguments:
+            return []
+
+        flt = json.loads(
+            api_arguments['flt']) \
+                if isinstance(api_arguments['flt'], str) \
+                else api_arguments['flt']
+        if isinstance(flt, dict):
+            flt = [flt]
+        return flt
+
+    def _ordering(self, api_arguments):
+        """The index and properties the results are ordered by. The API arguments override the collection."""
+        if 'order_by' in api_arguments or 'order_by_index' in api_arguments:
+            fields = api_arguments.get('order_by', [])
+            if not isinstance(fields, list):
+                fields = [fields]
+            index = api_arguments.get('order_by_index')
+            if index is None and fields:
+                if self.coll.index_order_by:
+                    index = next(
+                        (i for i, covered in self.coll.index_fields().items() if covered == tuple(fields)), None)
+                    if index is not None:
+                        self._index_for = tuple(fields)
+                        return index, ()
+                self.coll.log.warning("Ordering {0} by {1} in memory, since no index covers it.".format(
+                    self.coll.url, fields))
+            return index, tuple(fields)
+        else:
+            index, fields = self.coll.ordering()
+            if index is not None and not self.coll.order_by_index:
+                self._index_for = tuple(self.coll.order_by)
+            return index, fields
+
+    def _order_in_memory(self, reason):
+        """Sort by the properties the ordering index covers, instead of by the index."""
+        if self._index_for is not None:
+            fields = self._index_for
+        elif self.ordering_index in self.coll.index_fields():
+            fields = self.coll.index_fields()[self.ordering_index] + tuple(self.ordering_fields)
         else:
-            q = self.coll.apply_ordering(q)
+            return False  # a function index can't be sorted by in memory
 
+        self.ordering_index = self.page_index = None
+        self.ordering_fields = fields
+        self.coll.log.warning("Ordering {0} by {1} in memory, since {2}.".format(self.coll.url, list(fields), reason))
+        return True
+
+    def _integer(self, api_arguments, name, default=None):
+        try:
+            return int(api_arguments.get(name, default))
+        except (ValueError, TypeError):
+            raise jsonschema.ValidationError("{0} must be a whole number.".format(name))
+
+    def _page_size(self, api_arguments):
+        if 'limit' in api_arguments:
+            size = self._integer(api_arguments, 'limit')
+        elif api_arguments.get('end'):
+            size = self._integer(api_arguments, 'end') - self._integer(api_arguments, 'start', 0)
+        else:
+            size = self.coll.page_size
+        return max(1, min(size, self.coll.max_page_size))
+
+    def _handle_indexed_filters(self, api_arguments, flt, q):
+        # an index can only be used while the query is still the bare table.
+        if 'keys' in api_arguments or 'geo' in api_arguments:
+            if 'after' in api_arguments:
+                raise jsonschema.ValidationError("Page tokens can't be combined with keys or geo.")
+            if self.ordering_index:
+                self._order_in_memory("the index can't follow keys or geo")
+            return q, flt
+
+        # pages need a stable order. Without one, follow the index that serves the filter, or else the primary key.
+        follow_plan = self.page_size is not None and not (self.ordering_index or self.ordering_fields)
+        self.plan, rest = FilterPlanner(self.coll).plan(flt, None if follow_plan else self.ordering_index)
+        if follow_plan:
+            self.ordering_index = self.plan.index if self.plan is not None else self.coll.primary_key
+        elif self.plan is not None and self.ordering_index and self.plan.index != self.ordering_index:
+            # only another index serves the filter. its results are usually few, so sort them in memory.
+            if not self._order_in_memory("its filter uses index {0}".format(self.plan.index)):
+                self.plan, rest = None, flt
+
+        if self.page_size is not None and not self.ordering_fields and \
+                self.ordering_index in self.coll.index_fields():
+            self.page_index = self.ordering_index
+
+        if self.plan is not None:
+            flt = rest
+            log = self.coll.log.info if self.coll.suite.debug else self.coll.log.debug
+            log("Query plan for {0}: {1}".format(self.coll.url, self.plan))
+
+        if 'after' in api_arguments:
+            if self.page_index is None:
+                raise jsonschema.ValidationError("Page tokens can only be used on results ordered by a single index.")
+            return self._handle_page_token(api_arguments['after'], q), flt
+        elif self.plan is not None:
+            return self.plan.apply(self.coll.table, ordered=self.ordering_index is not None), flt
+        else:
+            return q, flt
+
+    def _handle_page_token(self, token, q):
+        key, pk = self._read_page_token(token)
+        # the page continues from the token up to where the filter's range on the index ends.
+        if self.plan is not None:
+            _, right, _, right_bound = self.plan.bounds()
+        else:
+            right, right_bound = r.maxval, 'closed'
+
+        if self.page_index == self.coll.primary_key:
+            return q.between(pk, right, index=self.page_index, left_bound='open', right_bound=right_bound)
+
+        # documents that tie on the index are ordered by primary key; skip the ones already seen.
+        fields = self.coll.index_fields()[self.page_index]
+        if len(fields) == 1:
+            value = r.row[fields[0]]
+        else:
+            value = r.expr([r.row[f] for f in fields])
+        self._page_filter = (value != key) | (r.row[self.coll.primary_key] > pk)
+        return q.between(key, right, index=self.page_index, left_bound='closed', right_bound=right_bound)
+
+    def _apply_index_ordering(self, q):
+        # order_by(index=...) has to come straight after the table or between(), before any filter().
+        if self.ordering_index:
+            q = q.order_by(*self.ordering_fields, index=self.ordering_index)
+            if self._page_filter is not None:
+                q = q.filter(self._page_filter)
+        return q
+
+    def _apply_ordering(self, q):
+        if self.ordering_fields and not self.ordering_index:
+            q = q.order_by(*self.ordering_fields)
         return q
 
     def _handle_keys(self, api_arguments, q):
@@ -88,44 +309,35 @@ class QuerySet(object):
                 q = self.coll.table.get_all(*json.loads(api_arguments['keys']))
         return q
 
-
-    def _handle_simple_filters(self, api_arguments, q):
+    def _handle_simple_filters(self, flt, q):
         # handle simple filters
-        if 'flt' in api_arguments:
-            flt = json.loads(
-                api_arguments['flt']) \
-                    if isinstance(api_arguments['flt'], str) \
-                    else api_arguments['flt']
-            if isinstance(flt, dict):
-                flt = [flt]
-
-            for f in flt:
-                default = f.get('default', False)
-                op = f.get('op', '==')
-                if op == '==':
-                    q = q.filter({f['lhs']: f['rhs']}, default=default)
-                elif op == '!=':
-                    q = q.filter(r.row[f['lhs']] != f['rhs'], default=default)
-                elif op == '<':
-                    q = q.filter(r.row[f['lhs']] < f['rhs'], default=default)
-                elif op == '<=':
-                    q = q.filter(r.row[f['lhs']] <= f['rhs'], default=default)
-                elif op == '>':
-                    q = q.filter(r.row[f['lhs']] > f['rhs'], default=default)
-                elif op == '>=':
-                    q = q.filter(r.row[f['lhs']] >= f['rhs'], default=default)
-                elif op == 'match':
-                    field = f['lhs']
-                    pattern  = f['rhs']
-                    q = q.filter(lambda x: x[field].match(pattern), default=default)
-                elif op == 'contains':
-                    field = f['lhs']
-                    pattern  = f['rhs']
-                    q = q.filter(lambda x: x[field].contains(pattern))
-                elif op == 'has_fields':
-                    q = q.filter(lambda x: x.has_fields(f['fields']), default=default)
-                else:
-                    raise ValidationError("Unrecognized op in filter specification.")
+        for f in flt:
+            default = f.get('default', False)
+            op = f.get('op', '==')
+            if op == '==':
+                q = q.filter({f['lhs']: f['rhs']}, default=default)
+            elif op == '!=':
+                q = q.filter(r.row[f['lhs']] != f['rhs'], default=default)
+            elif op == '<':
+                q = q.filter(r.row[f['lhs']] < f['rhs'], default=default)
+            elif op == '<=':
+                q = q.filter(r.row[f['lhs']] <= f['rhs'], default=default)
+            elif op == '>':
+                q = q.filter(r.row[f['lhs']] > f['rhs'], default=default)
+            elif op == '>=':
+                q = q.filter(r.row[f['lhs']] >= f['rhs'], default=default)
+            elif op == 'match':
+                field = f['lhs']
+                pattern  = f['rhs']
+                q = q.filter(lambda x: x[field].match(pattern), default=default)
+            elif op == 'contains':
+                field = f['lhs']
+                pattern  = f['rhs']
+                q = q.filter(lambda x: x[field].contains(pattern))
+            elif op == 'has_fields':
+                q = q.filter(lambda x: x.has_fields(f['fields']), default=default)
+            else:
+                raise ValidationError("Unrecognized op in filter specification.")
         return q
 
     def _handle_spatial_filters(self, coll, api_arguments, q):
@@ -154,6 +366,37 @@ class QuerySet(object):
             q = getattr(q, op)(geom, index=test_property, *geo.get('args',[]), **geo.get('kwargs', {}))
         return q
 
+    def _read_fields(self, value):
+        if isinstance(value, str):
+            try:
+                value = json.loads(value) if value.startswith('[') else value.split(',')
+            except ValueError:
+                value = None
+        if not isinstance(value, list) or not all(isinstance(f, str) and f for f in value):
+            raise jsonschema.ValidationError("fields and without take a list of property names.")
+        return value
+
+    def _handle_projection(self, api_arguments, q):
+        # drop unwanted properties in the database, so they are never sent over the wire or converted.
+        if 'fields' in api_arguments and 'without' in api_arguments:
+            raise jsonschema.ValidationError("Use fields or without, not both.")
+
+        # the primary key is needed for URLs, and the page index for the next page token.
+        required = {self.coll.primary_key}
+        if self.page_index is not None:
+            required.update(self.coll.index_fields()[self.page_index])
+
+        if 'fields' in api_arguments:
+            fields = self._read_fields(api_arguments['fields'])
+            q = q.pluck(*projection(fields + sorted(required - set(fields))))
+            self.partial = True
+        elif 'without' in api_arguments:
+            fields = [f for f in self._read_fields(api_arguments['without']) if f.split('.')[0] not in required]
+            if fields:
+                q = q.without(*projection(fields))
+                self.partial = True
+        return q
+
     def _handle_aggregations(self, api_arguments,  q):
         # handle aggregation queries
         if 'agg' in api_arguments:
@@ -165,8 +408,13 @@ class QuerySet(object):
         return q
 
     def _handle_limits(self, api_arguments, q):
+        if self.page_size is not None:
+            if 'start' in api_arguments and 'after' not in api_arguments:
+                q = q.skip(self._integer(api_arguments, 'start'))
+            return q.limit(self.page_size + 1)  # one extra result tells us whether there is another page
+
         # handle start, limit, and end
-        if 'start' and 'end' in api_arguments:
+        if 'start' in api_arguments and 'end' in api_arguments:
             s = api_arguments['start']
             e = api_arguments['end']
             if e == 0:
@@ -180,6 +428,6 @@ class QuerySet(object):
             if 'limit' in api_arguments:
                 limit = api_arguments['limit']
                 q = q.limit(limit)
-            #else:
-            #    q = q.limit(self.MAX_RESULTS)
-        return q
\ No newline at end of file
+        if self.max_size is not None and not self.use_raw_results:
+            q = q.limit(self.max_size)
+        return q
@@ -1,10 +1,29 @@
 from urllib.parse import urlencode, urlparse, parse_qs
 
+from jsonschema import ValidationError
+
 from sondra.utils import is_exposed
 
 from sondra.api.expose import method_schema
 
 
+def _stored_prefix(coll, path):
+    """The part of a fragment path that can be picked out of a document in the database."""
+    prefix = path[:1]
+    if not path or path[0] in coll.document_class.specials:
+        return prefix  # special values are converted as a whole
+
+    for part in path[1:]:
+        try:
+            schema = coll.property_schema('.'.join(prefix))
+        except ValidationError:
+            break
+        if schema.get('type') != 'object' or part.isdigit():
+            break
+        prefix.append(part)
+    return prefix
+
+
 class ParseError(Exception):
     """Called when an API request is not parsed as valid"""
 
@@ -15,7 +34,7 @@ class EndpointError(Exception):
 
 class Reference(object):
     """Contains the application, collection, document, methods, and fragment the URL refers to"""
-    FORMATS = {'help', 'schema', 'json', 'geojson', 'html'}
+    FORMATS = {'help', 'schema', 'json', 'ndjson', 'geojson', 'html', 'msgpack', 'cbor', 'arrow', 'parquet'}
 
     def __str__(self):
         return self.url
@@ -321,23 +340,36 @@ class Reference(object):
             raise EndpointError("{0} document not found.\n{1}".format(self.url, e))
 
     def get_subdocument(self):
-        """Return the fragment within the Document referred to by this URL."""
+        """Return the fragment within the Document referred to by this URL.
+
+        Only the properties on the fragment's path are read from the database: as deep as the path runs through plain
+        objects, and as far as the first special property or array otherwise. The rest of the path is walked in
+        Python, fetching any foreign keys along the way.
+
+        Returns:
+            tuple: The document, the document the fragment is directly inside (which differs from the first if the
+              path goes through a foreign key), the path within that document, and the value of the fragment.
+        """
         from sondra.document import Document
-        path = self.fragment
-        frag = parent = d = self.get_document()
-        frag.collection.application.dereference(frag)
-        walk = []
+        path = [p for p in self.fragment if p]
+        if not path:
+            frag = parent = d = self.get_document()
+        else:
+            coll = self.get_collection()
+            try:
+                frag = parent = d = coll.get_fields(self.doc, ['.'.join(_stored_prefix(coll, path))])
+            except KeyError as e:
+                raise EndpointError("{0} document not found.\n{1}".format(self.url, e))
 
+        walk = []
         try:
-            while path:
+            for key in path:
                 if isinstance(frag, Document):
                     parent = frag
                     walk = []
-                key = path.pop(0)
                 walk.append(key)
-                frag = frag[key]
-
-        except KeyError:
+                frag = frag[int(key)] if isinstance(frag, list) else frag[key]
+        except (KeyError, IndexError, ValueError, TypeError):
             raise EndpointError("{0} not found in document".format('/'.join(self.fragment)))
 
         return d, parent, tuple(walk), frag
@@ -73,7 +73,9 @@ class Application(Mapping, metaclass=ApplicationMetaclass):
 
     Attributes:
         db (str): The name of a RethinkDB database
-        connection (str): The name of a RethinkDB connection in the application's suite
+        connection: read-only. The RethinkDB connection the current thread has checked out of the suite's pool named
+          by ``connection_name``.
+        connection_name (str): The name of a RethinkDB connection in the application's suite
         slug (str): read-only. The name of this application class, slugified (all lowercase, and separate words with -)
         anonymous_reads (bool=True): Override this attribute in your subclass if you want to disable anonymous queries
           for help and schema for this application and all its collections.
@@ -104,7 +106,19 @@ class Application(Mapping, metaclass=ApplicationMetaclass):
 
     @property
     def connection(self):
-        return self.suite.connections[self.connection_name]
+        return self.suite.connections[self.connection_name].connection
+
+    def run(self, query, **kwargs):
+        """Run a query on this application's connection, reconnecting once if the connection has dropped.
+
+        Args:
+            query (ReQL): The query to run.
+            **kwargs: Passed to ``query.run()``.
+
+        Returns:
+            The result of the query.
+        """
+        return self.suite.connections[self.connection_name].run(query, **kwargs)
 
     @property
     def url(self):
@@ -232,9 +246,19 @@ class Application(Mapping, metaclass=ApplicationMetaclass):
                 if k not in coll.schema['definitions']:
                     coll.schema['definitions'][k] = v
 
+            # assigning specials also compiles the document class's converters. see sondra.document.converters
             coll.document_class.specials = SchemaParser(coll.schema, coll.schema['definitions'])()
 
+            # compile validators up front so the first request doesn't pay for it
+            coll.schema_validator
+            for method_name in coll.exposed_methods:
+                self.suite.method_request_validator(coll, getattr(coll, method_name))
+            for method in coll.document_class.exposed_methods.values():
+                self.suite.method_request_validator(coll, method)
+
             self._collections[name] = coll
+        for method in self.exposed_methods.values():
+            self.suite.method_request_validator(self, method)
         signals.post_init.send(self.__class__, instance=self)
 
     def __hash__(self):
@@ -253,11 +277,13 @@ class Application(Mapping, metaclass=ApplicationMetaclass):
         return item in self._collections
 
     def clear_tables(self):
-        tables = {t for t in r.db(self.db).table_list().run(self.connection)}
+        tables = {t for t in self.run(r.db(self.db).table_list())}
         for coll in self._collections.values():
             if coll.name in tables:
                 coll.raw_query.delete()()
                 coll.ensure_indexes()
+            if coll.cache is not None:
+                coll.cache.clear()
 
     def create_tables(self, *args, warn_if_exists=False, **kwargs):
         """Create tables in the db for all collections in the application.
@@ -281,7 +307,7 @@ class Application(Mapping, metaclass=ApplicationMetaclass):
         """
         signals.pre_create_tables.send(self.__class__, instance=self, args=args, kwargs=kwargs)
 
-        tables = {t for t in r.db(self.db).table_list().run(self.connection)}
+        tables = {t for t in self.run(r.db(self.db).table_list())}
         for coll in self._collections.values():
             if coll.name not in tables:
                 coll.create_table(*args, **kwargs)
@@ -314,7 +340,7 @@ class Application(Mapping, metaclass=ApplicationMetaclass):
 
         signals.pre_delete_tables.send(self.__class__, instance=self, args=args, kwargs=kwargs)
 
-        tables = {t for t in r.db(self.db).table_list().run(self.connection)}
+        tables = {t for t in self.run(r.db(self.db).table_list())}
         for collection_class in self._collections.values():
             if collection_class.name in tables:
                 collection_class.drop_table(*args, **kwargs)
@@ -330,9 +356,9 @@ class Application(Mapping, metaclass=ApplicationMetaclass):
             None
         """
 
-        dbs = r.db_list().run(self.connection)
+        dbs = self.run(r.db_list())
         if self.db not in dbs:
-            r.db_create(self.db).run(self.connection)
+            self.run(r.db_create(self.db))
 
     def drop_database(self):
         """Drop the db for the application.
@@ -343,6 +369,6 @@ class Application(Mapping, metaclass=ApplicationMetaclass):
             None
         """
 
-        dbs = r.db_list().run(self.connection)
+        dbs = self.run(r.db_list())
         if self.db in dbs:
-            r.db_drop(self.db).run(self.connection)
+            self.run(r.db_drop(self.db))
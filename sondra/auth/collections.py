@@ -293,7 +293,7 @@ class LoggedInUsers(Collection):
     private = True
 
     def for_token(self, token):
-        result = self.table.get_all(token, index='token').run(self.application.connection)
+        result = self.application.run(self.table.get_all(token, index='token'))
         try:
             return self.document_class(next(result), self, True)
         except StopIteration:
@@ -0,0 +1,72 @@
+"""JSON encoders and decoders for API requests and responses.
+
+Encoding responses is a large share of the work of an API request. The standard library's encoder calls back into
+Python for every value it doesn't know, which includes every ``datetime``. `orjson`_, if it is installed, encodes
+datetimes, dicts, and ``OrderedDict`` natively and only calls back for documents, so it is used by default. Set
+``Suite.json_codec_name`` to choose a codec explicitly.
+
+A codec has two methods, ``dumps(obj, default=None, **kwargs)``, which takes the same keyword arguments as
+:func:`json.dumps` and returns a string, and ``loads(s)``, which takes a string or bytes and raises
+:class:`ValueError` on invalid input.
+
+.. _orjson: https://pypi.org/project/orjson/
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class StdlibCodec(object):
+    """Encodes and decodes with Python's :mod:`json` module."""
+    name = 'json'
+
+    def dumps(self, obj, default=None, **kwargs):
+        return json.dumps(obj, default=default, **kwargs)
+
+    def loads(self, s):
+        if isinstance(s, bytes):
+            s = s.decode('utf-8')
+        return json.loads(s)
+
+
+class OrjsonCodec(StdlibCodec):
+    """Encodes and decodes with orjson.
+
+    orjson only indents by two spaces and doesn't take most of :func:`json.dumps`'s options, so calls that use any
+    other options are passed on to the standard library.
+    """
+    name = 'orjson'
+    OPTIONS = {'indent', 'sort_keys'}
+
+    def dumps(self, obj, default=None, **kwargs):
+        if set(kwargs) - self.OPTIONS or kwargs.get('indent') not in (None, 2):
+            return super(OrjsonCodec, self).dumps(obj, default=default, **kwargs)
+
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        if kwargs.get('sort_keys'):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=default, option=option).decode('utf-8')
+
+    def loads(self, s):
+        return orjson.loads(s)
+
+
+JSON_CODECS = {'json': StdlibCodec}
+if orjson is not None:
+    JSON_CODECS['orjson'] = OrjsonCodec
+
+
+def json_codec(name=None):
+    """Return a JSON codec by name, or the fastest one installed if ``name`` is None.
+
+    Raises:
+        KeyError: if the named codec isn't installed.
+    """
+    if name is None:
+        name = 'orjson' if 'orjson' in JSON_CODECS else 'json'
+    return JSON_CODECS[name]()
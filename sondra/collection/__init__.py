@@ -1,23 +1,102 @@
 import logging
 import logging.config
+import re
 from abc import ABCMeta
-from collections.abc import MutableMapping
+from collections import OrderedDict
+from collections.abc import ItemsView, MutableMapping, ValuesView
 from copy import deepcopy, copy
+from string import Formatter
 
 import jsonschema
 import rethinkdb as r
 
 from sondra import help, utils
 from sondra.api.expose import method_schema, expose_method_explicit
-from sondra.collection.query_set import QuerySet, RawQuerySet
+from sondra.collection.cache import DocumentCache
+from sondra.collection.query_set import QuerySet, RawQuerySet, projection
 from sondra.document import Document, signals as doc_signals
+from sondra.document.lazy import LazyDocument
+from sondra.document.schema_parser import PropertiesHandler, PropertyHandler, PatternPropertiesHandler, \
+    KeyValueHandler, ValueHandler
 from sondra.exceptions import ValidationError
 from sondra.utils import mapjson, resolve_class, split_camelcase
+from sondra.validation import SchemaValidator
 from . import signals
 
 _validator = jsonschema.Draft4Validator
 
 
+def _template_fields(template):
+    """The top-level document properties a format string refers to, or None if they can't be determined."""
+    fields = set()
+    for _, name, _, _ in Formatter().parse(template):
+        if name is None:
+            continue
+        root = re.split(r'[.\[]', name, 1)[0]
+        if not root or root.isdigit():
+            return None
+        fields.add(root)
+    return fields
+
+
+def _is_compound(index_function):
+    return isinstance(index_function, (tuple, list)) and all(isinstance(f, str) for f in index_function)
+
+
+def _merge_write_results(results, unchanged=0):
+    """Add up the counts of several RethinkDB write results, and concatenate their lists."""
+    if len(results) == 1 and not unchanged:
+        return results[0]
+
+    ret = {'unchanged': unchanged}
+    for result in results:
+        for k, v in result.items():
+            if isinstance(v, list):
+                ret.setdefault(k, []).extend(v)
+            elif isinstance(v, int) and not isinstance(v, bool):
+                ret[k] = ret.get(k, 0) + v
+            else:
+                ret.setdefault(k, v)
+    return ret
+
+
+class CollectionValues(ValuesView):
+    """The documents in a collection, as returned by :meth:`Collection.values`.
+
+    Each iteration streams the documents, in order, from a single query. ``len()`` counts them in the database.
+    """
+    def __iter__(self):
+        coll = self._mapping
+        return coll.q(coll.apply_ordering(coll.table))
+
+
+class CollectionItems(ItemsView):
+    """(primary key, document) pairs for a collection, as returned by :meth:`Collection.items`.
+
+    Each iteration streams the documents, in order, from a single query. ``len()`` counts them in the database.
+    """
+    def __iter__(self):
+        coll = self._mapping
+        for doc in coll.values():
+            yield doc.obj[coll.primary_key], doc
+
+
+def _sub_handler(handler, part, path):
+    """The value handler for ``part`` inside a value handled by ``handler``, for patching a nested property."""
+    if handler is None:
+        return None
+    elif isinstance(handler, PropertiesHandler):
+        return handler.sub_handlers.get(part)
+    elif isinstance(handler, PropertyHandler):
+        return handler.sub_handler if part == handler.prop else None
+    elif isinstance(handler, PatternPropertiesHandler):
+        return next((h for p, h in handler.sub_handlers.items() if re.search(p, part)), None)
+    elif isinstance(handler, KeyValueHandler):
+        return handler.sub_handler
+    else:
+        raise jsonschema.ValidationError("{0} can't be patched in place. Set the whole property.".format(path))
+
+
 class CollectionException(Exception):
     """Represents a misconfiguration in a :class:`Collection` class definition"""
 
@@ -148,7 +227,38 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
         private (bool=False). If the collection is private, then it is not exposed by the webservice interface. This
           can be very useful for collections whose data should never be available over the 'net.
         specials (dict): A dictionary of properties to be treated specially.
-        indexes ([str])
+        cache_size (int=0): If nonzero, keep up to this many recently read documents in an in-process cache, so that
+          ``collection[key]`` can skip the database. Cached documents are dropped when they are saved or deleted.
+        cache_ttl (float=60): Seconds a cached document stays valid. None means documents only leave the cache when
+          they are evicted, saved, or deleted.
+          If the suite has ``invalidation_feeds`` on, writes from other processes also drop cached documents.
+        cache_queries (bool=False): If True, every whole document a query returns is cached too. Otherwise only
+          documents read by key (``collection[key]`` and :meth:`get_many`) are cached, so that listing a large
+          collection doesn't evict the documents that are read again and again.
+        cache (DocumentCache): The cache instance, or None if ``cache_size`` is 0.
+        lazy_documents (bool=False): If True, queries yield :class:`sondra.document.lazy.LazyDocument` proxies, which
+          only convert special values when they are read. This saves a lot of work for documents that are only read
+          and serialized again, as in API list requests.
+        page_size (int=100): The number of documents the API returns per page when the request doesn't set ``limit``.
+        max_page_size (int=1000): The largest page the API will return, whatever ``limit`` is requested.
+          Streamed responses (``ndjson``, ``arrow``, ``parquet``, or ``stream=true``) aren't paged, but still stop
+          after this many documents.
+        unlimited_streams (bool=False): Let streamed responses return every matching document instead of stopping at
+          ``max_page_size``. Streams never hold the results in memory, so this suits bulk exports, but it lets any
+          client read the whole collection in one request.
+        schema_validator (sondra.validation.SchemaValidator): read-only. The compiled validator for ``schema``.
+        indexes ([str]): Property names to index. An entry may also be a ``(name, definition)`` tuple, where the
+          definition is a ReQL index function or a tuple of property names for a compound index.
+        order_by (tuple): Property names that documents are ordered by when a query doesn't say otherwise.
+        order_by_index (str): The index that documents are ordered by, if not the one for ``order_by``.
+        index_order_by (bool=False): If ``order_by`` is set without ``order_by_index``, order by an index on those
+          properties, so that ordered results stream from the database instead of being sorted in memory. An index in
+          ``indexes`` with the same properties is used if there is one; otherwise a compound index named after the
+          properties is added to ``indexes``. API requests for ``order_by`` properties that an index covers use it too.
+          Only turn this on if every document has all the properties, since documents missing any of them are left
+          out of index-ordered results. A filter that uses the ordering index is applied with ``between()`` on it.
+          Queries by ``keys`` or ``geo``, and queries whose filter only uses some other index, are sorted in memory
+          by the ordering properties after that index has narrowed them down.
         relations (dict)
         anonymous_reads (bool=True)
         abstract (bool)
@@ -177,6 +287,14 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
     autocomplete_props = None
     order_by = None
     order_by_index = None
+    index_order_by = False
+    cache_size = 0
+    cache_ttl = 60
+    cache_queries = False
+    page_size = 100
+    max_page_size = 1000
+    unlimited_streams = False
+    lazy_documents = False
 
     @property
     def language(self):
@@ -217,18 +335,42 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
         self.schema['id'] = self.url + ";schema"
         self.schema = mapjson(lambda x: x(context=self.application.suite) if callable(x) else x, self.schema)
         self.log = logging.getLogger(self.application.name + "." + self.name)
+        self._schema_validator = None
+        self._property_validators = {}
 
         if self.autocomplete_props is None:
             self.autocomplete_props = (self.primary_key,)
 
+        if self.order_by and self.index_order_by and self.ordering()[0] is None:
+            self.log.warning("{0} is ordered by {1} in memory, since no index covers it.".format(
+                self.url, self.order_by))
+
         if self.file_storage:
             self.file_storage = self.file_storage(self)
 
+        if self.cache_size:
+            self.cache = DocumentCache(self.cache_size, self.cache_ttl)
+            doc_signals.post_save.connect(self._invalidate_saved, sender=self.document_class)
+            doc_signals.post_delete.connect(self._invalidate_deleted, sender=self.document_class)
+            if self.suite.invalidation_bus is not None:
+                self.suite.invalidation_bus.watch(self)
+        else:
+            self.cache = None
+
+        doc_signals.post_save.connect(self._identity_saved, sender=self.document_class)
+        doc_signals.post_delete.connect(self._identity_deleted, sender=self.document_class)
+
         signals.post_init.send(self.__class__, instance=self)
 
     def __str__(self):
         return self.url
 
+    @property
+    def schema_validator(self):
+        if self._schema_validator is None:
+            self._schema_validator = SchemaValidator(self.schema)
+        return self._schema_validator
+
     @property
     def query(self):
         return QuerySet(self)
@@ -278,16 +420,99 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
         return builder.rst
 
     def ensure_indexes(self):
-        existing_indexes = {i for i in self.table.index_list().run(self.application.connection)}
-        required_indexes = set(self.indexes)
+        existing_indexes = {i for i in self.application.run(self.table.index_list())}
+        definitions = self.index_definitions()
+        required_indexes = set(definitions)
         extra_indexes = existing_indexes.difference(required_indexes)
         missing_indexes = required_indexes.difference(existing_indexes)
 
         if missing_indexes:
-            self._create_indexes(missing_indexes)
+            self._create_indexes([(name, definitions[name]) for name in missing_indexes])
 
         for index in extra_indexes:
-            self.table.index_drop(index).run(self.application.connection)
+            self.application.run(self.table.index_drop(index))
+
+    def index_definitions(self):
+        """Normalize ``indexes`` into a mapping of index name to definition.
+
+        An entry in ``indexes`` is either a property name, or a tuple of ``(name, definition)`` where the definition
+        is a ReQL index function or a tuple of property names for a compound index.
+
+        Returns:
+            OrderedDict: index name to definition. The definition is None for simple indexes on a property.
+        """
+        definitions = OrderedDict()
+        for index in self.indexes:
+            if isinstance(index, tuple):
+                index, index_function = index
+            else:
+                index_function = None
+            definitions[index] = index_function
+
+        index, fields = self._order_by_index()
+        if index is not None and index != self.primary_key and index not in definitions:
+            definitions[index] = fields if len(fields) > 1 else None
+        return definitions
+
+    def _order_by_index(self):
+        """The index for ``order_by`` if ``index_order_by`` is on, and the properties it covers, or ``(None, ())``."""
+        if self.order_by_index or not self.order_by or not self.index_order_by:
+            return None, ()
+
+        fields = tuple(self.order_by)
+        if not all(isinstance(f, str) for f in fields):
+            return None, ()  # r.desc() and functions can't be index fields
+        if len(fields) == 1 and (self._is_multi_index(fields[0]) or self._is_geo_index(fields[0])):
+            return None, ()
+        if fields == (self.primary_key,):
+            return self.primary_key, fields
+
+        name = '_'.join(fields)
+        for index in self.indexes:
+            index, definition = index if isinstance(index, tuple) else (index, None)
+            if (definition is None and (index,) == fields) or \
+                    (_is_compound(definition) and tuple(definition) == fields):
+                return index, fields
+            elif index == name:
+                return None, ()  # the name is taken by some other index
+        return name, fields
+
+    def ordering(self):
+        """The index and properties that queries on this collection are ordered by when they don't say otherwise.
+
+        Returns:
+            (str, tuple): The index to pass to ``order_by()``, or None, and the properties to order by besides.
+        """
+        if self.order_by_index:
+            return self.order_by_index, tuple(self.order_by or ())
+
+        index, _ = self._order_by_index()
+        if index is not None:
+            return index, ()
+        return None, tuple(self.order_by or ())
+
+    def index_fields(self):
+        """The indexes a query can use to look up documents by value, including the primary key.
+
+        Multi, geospatial, and function indexes are left out, since their keys aren't plain property values.
+
+        Returns:
+            OrderedDict: index name to a tuple of the property names it covers, in order.
+        """
+        fields = OrderedDict([(self.primary_key, (self.primary_key,))])
+        for index, definition in self.index_definitions().items():
+            if definition is None:
+                if not (self._is_multi_index(index) or self._is_geo_index(index)):
+                    fields[index] = (index,)
+            elif _is_compound(definition):
+                fields[index] = tuple(definition)
+        return fields
+
+    def _is_multi_index(self, index):
+        return self.schema['properties'].get(index, {}).get('type', None) == 'array'
+
+    def _is_geo_index(self, index):
+        return index in self.document_class.specials and self.document_class.specials[index].is_geometry
 
     def validate_documents(self, batch_exceptions=True):
         validation_exceptions = {}
@@ -309,23 +534,19 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
             else:
                 index_function = None
 
-            if self.schema['properties'][index].get('type', None) == 'array':
-                multi = True
-            else:
-                multi = False
-
-            if index in self.document_class.specials and self.document_class.specials[index].is_geometry:
-                geo = True
+            if _is_compound(index_function):
+                index_function = [r.row[field] for field in index_function]
+                multi = geo = False
             else:
-                geo = False
+                multi = self._is_multi_index(index)
+                geo = self._is_geo_index(index)
 
             try:
                 if index_function:
-                    self.table.index_create(index, index_function, multi=multi, geo=geo).run(
-                        self.application.connection)
+                    self.application.run(self.table.index_create(index, index_function, multi=multi, geo=geo))
                 else:
-                    self.table.index_create(index, multi=multi, geo=geo).run(self.application.connection)
-                self.table.index_wait(index).run(self.application.connection)
+                    self.application.run(self.table.index_create(index, multi=multi, geo=geo))
+                self.application.run(self.table.index_wait(index))
                 self.log.info('Created Index {2} on table {0}.{1}'.format(self.application.db, self.name, index))
             except r.ReqlError as e:
                 self.log.info(
@@ -339,13 +560,12 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
             self.__class__, instance=self, table_name=self.name, db_name=self.application.db)
 
         try:
-            r.db(self.application.db)\
-                .table_create(self.name, primary_key=self.primary_key, *args, **kwargs)\
-                .run(self.application.connection)
+            self.application.run(r.db(self.application.db)\
+                .table_create(self.name, primary_key=self.primary_key, *args, **kwargs))
         except r.ReqlError as e:
             self.log.info('Table {0}.{1} already exists.'.format(self.application.db, self.name))
 
-        self._create_indexes(self.indexes)
+        self._create_indexes(list(self.index_definitions().items()))
         signals.post_table_creation.send(
             self.__class__, instance=self, table_name=self.name, db_name=self.application.db)
 
@@ -356,7 +576,7 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
         signals.pre_table_deletion.send(
             self.__class__, instance=self, table_name=self.name, db_name=self.application.db)
 
-        ret = r.db(self.application.db).table_drop(self.name).run(self.application.connection)
+        ret = self.application.run(r.db(self.application.db).table_drop(self.name))
         self.log.info('Dropped table {0}.{1}'.format(self.application.db, self.name))
 
         signals.post_table_deletion.send(
@@ -369,9 +589,11 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
             self.__class__, instance=self, table_name=self.name, db_name=self.application.db)
 
         try:
-            self.q(self.table.delete())
+            self.application.run(self.table.delete())
         except:
             self.create_table()
+        if self.cache is not None:
+            self.cache.clear()  # or reads by key would keep finding the deleted documents
 
         signals.post_table_clear.send(
             self.__class__, instance=self, table_name=self.name, db_name=self.application.db)
@@ -382,6 +604,8 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
     def __getitem__(self, key):
         """Get an object from the database and populate an instance of self.document_class with its contents.
 
+        While the suite has an identity map open, a document that was already loaded is returned as is.
+
         Args:
             key (str or int): Primary key for the document.
 
@@ -394,12 +618,114 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
         if isinstance(key, Document):  # handle the case where our primary key is a foreign key and the user passes in the instance.
             key = key.id
 
-        doc = self.table.get(key).run(self.application.connection)
+        identity_map = self.suite.identity_map
+        if identity_map is not None:
+            doc = identity_map.get(self, key)
+            if doc is not None:
+                return doc
+
+        doc = self.cache.get(key) if self.cache is not None else None
+        if doc is None:
+            doc = self.application.run(self.table.get(key))
+            if doc and self.cache is not None:
+                self.cache.put(key, doc)
+
         if doc:
-            return self.document_class(doc, collection=self, from_db=True)
+            doc = self.document_class.from_db(doc, self)
+            if identity_map is not None:
+                identity_map.put(doc)
+            return doc
         else:
             raise KeyError('{0} not found in {1}'.format(key, self.url))
 
+    def get_many(self, keys, missing='skip'):
+        """Get several documents in a single query.
+
+        Documents in the cache or the suite's identity map are not fetched again.
+
+        Args:
+            keys (list): Primary keys (or Document instances) to fetch.
+            missing (str='skip'): What to do about keys that aren't in the database. ``'skip'`` leaves them out of the
+              result, ``'error'`` raises KeyError.
+
+        Returns:
+            list: Instances of self.document_class, in the same order as ``keys``.
+
+        Raises:
+            KeyError if ``missing`` is ``'error'`` and any key is not found in the database.
+        """
+        if missing not in {'skip', 'error'}:
+            raise ValueError("missing must be 'skip' or 'error'")
+
+        keys = [k.id if isinstance(k, Document) else k for k in keys]
+        identity_map = self.suite.identity_map
+        loaded = {}
+        if identity_map is not None:
+            for k in keys:
+                doc = identity_map.get(self, k)
+                if doc is not None:
+                    loaded[k] = doc
+
+        rows = {}
+        if self.cache is not None:
+            for k in keys:
+                if k in loaded:
+                    continue
+                row = self.cache.get(k)
+                if row is not None:
+                    rows[k] = row
+
+        wanted = [k for k in OrderedDict.fromkeys(keys) if k not in rows and k not in loaded]
+        if wanted:
+            for row in self.application.run(self.table.get_all(*wanted)):
+                k = row[self.primary_key]
+                rows[k] = row
+                if self.cache is not None:
+                    self.cache.put(k, row)
+
+        if missing == 'error':
+            not_found = [k for k in keys if k not in rows and k not in loaded]
+            if not_found:
+                raise KeyError('{0} not found in {1}'.format(', '.join(str(k) for k in not_found), self.url))
+
+        for k, row in rows.items():
+            if k not in loaded:
+                loaded[k] = self.document_class.from_db(row, self)
+                if identity_map is not None:
+                    identity_map.put(loaded[k])
+        return [loaded[k] for k in keys if k in loaded]
+
+    def get_fields(self, key, fields):
+        """Get only some properties of a document.
+
+        The properties are picked out in the database with ``pluck()``, so the rest of the document is never read. The
+        result is a partial document, which isn't cached or added to the identity map. If the whole document is
+        already in the identity map or the cache, that is returned instead.
+
+        Args:
+            key (str or int): Primary key for the document.
+            fields (list): The property paths to get, with nested properties separated by dots.
+
+        Returns:
+            Document: An instance of self.document_class.
+
+        Raises:
+            KeyError if the object is not found in the database.
+        """
+        if isinstance(key, Document):
+            key = key.id
+
+        identity_map = self.suite.identity_map
+        if (identity_map is not None and identity_map.get(self, key) is not None) or \
+                (self.cache is not None and key in self.cache):
+            return self[key]
+
+        query = self.table.get_all(key).pluck(*projection(list(fields) + [self.primary_key]))
+        doc = next(self.q(query, partial=True, lazy=False), None)
+        if doc is None:
+            raise KeyError('{0} not found in {1}'.format(key, self.url))
+        return doc
+
     def __setitem__(self, key, value):
         """Add or replace a document object to the database.
 
@@ -421,14 +747,33 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
             key (str or int): The primary key for the document.
         """
         doc_signals.pre_delete.send(self.document_class, key=key)
-        results = self.table.get(key).delete().run(self.application.connection)
-        doc_signals.post_delete.send(self.document_class, results=results)
+        results = self.application.run(self.table.get(key).delete())
+        doc_signals.post_delete.send(self.document_class, collection=self, key=key, results=results)
 
     def __iter__(self):
         query = self.apply_ordering(self.table).get_field(self.primary_key)
-        for k in query.run(self.application.connection):
+        for k in self.application.run(query):
             yield k
 
+    def values(self):
+        """Every document in the collection, in order.
+
+        Unlike the MutableMapping default, iterating doesn't fetch each document separately by key, but streams them all
+        from a single query. The view can be iterated more than once; each time runs the query again.
+
+        Returns:
+            CollectionValues: A view of Document instances.
+        """
+        return CollectionValues(self)
+
+    def items(self):
+        """(primary key, document) pairs for the whole collection, in order. See :meth:`values`.
+
+        Returns:
+            CollectionItems: A view of (key, Document) tuples.
+        """
+        return CollectionItems(self)
+
     def __contains__(self, item):
         """Checks to see if the primary key is in the database.
 
@@ -445,37 +790,82 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
         else:
             key = item
 
-        doc = self.table.get(key).run(self.application.connection)
+        if self.cache is not None and key in self.cache:
+            return True
+
+        doc = self.application.run(self.table.get(key))
         return doc is not None
 
     def __len__(self):
-        return self.table.count().run(self.application.connection)
+        return self.application.run(self.table.count())
 
-    def q(self, query):
+    def q(self, query, partial=False, lazy=None):
         """Perform a query on this collection's database connection.
 
         Args:
             query (ReQL): Should be a RethinkDB query that returns documents for this collection.
+            partial (bool=False): Set if the query only returns some fields of each document, as with ``pluck``.
+              Partial documents are never cached, and defaults aren't filled in for the properties they lack.
+              Whole documents are only cached if ``cache_queries`` is on.
+            lazy (bool): Yield :class:`LazyDocument` proxies instead of documents. Defaults to ``lazy_documents``.
 
         Yields:
             Document instances.
         """
-        for doc in query.run(self.application.connection):
+        if lazy is None:
+            lazy = self.lazy_documents
+        lazy = lazy and LazyDocument.can_wrap(self.document_class)
+
+        for doc in self.application.run(query):
             meta = {}
             if 'doc' in doc:
                 meta = doc
                 doc = doc['doc']  # some queries return results that encapsulate the document with metadata
                 del meta['doc']
 
-            yield self.document_class(doc, collection=self, from_db=True, metadata=meta)
+            if self.cache is not None and self.cache_queries and not partial and self.primary_key in doc:
+                self.cache.put(doc[self.primary_key], doc)
+
+            if lazy and LazyDocument.can_wrap_row(self.document_class, doc):
+                yield LazyDocument(doc, self, metadata=meta, partial=partial)
+            else:
+                yield self.document_class.from_db(doc, self, metadata=meta, partial=partial)
+
+    def _invalidate_saved(self, sender, instance=None, **kwargs):
+        if instance is not None and instance.collection is self:
+            self.cache.invalidate(instance.id)
+
+    def _invalidate_deleted(self, sender, collection=None, key=None, keys=None, **kwargs):
+        if collection is not self:
+            return
+        if key is not None:
+            self.cache.invalidate(key)
+        elif keys is not None:
+            self.cache.invalidate(*keys)
+        else:
+            self.cache.clear()
+
+    def _identity_saved(self, sender, instance=None, **kwargs):
+        identity_map = self.suite.identity_map
+        if identity_map is not None and instance is not None and instance.collection is self:
+            identity_map.put(instance)
+
+    def _identity_deleted(self, sender, collection=None, key=None, keys=None, **kwargs):
+        identity_map = self.suite.identity_map
+        if identity_map is None or collection is not self:
+            return
+        if key is not None:
+            identity_map.discard(self, key)
+        else:
+            identity_map.discard(self, *(keys or ()))
 
     def apply_ordering(self, query):
-        if self.order_by_index and self.order_by:
-            return query.order_by(index=self.order_by_index, *self.order_by)
-        elif self.order_by_index:
-            return query.order_by(index=self.order_by_index)
-        elif self.order_by:
-            return query.order_by(*self.order_by)
+        """Order a query on the table the way :meth:`ordering` says."""
+        index, fields = self.ordering()
+        if index:
+            return query.order_by(*fields, index=index)
+        elif fields:
+            return query.order_by(*fields)
         else:
             return query
 
@@ -541,7 +931,9 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
             The result of RethinkDB delete.
         """
         if not docs:
-            return self.table.delete(**kwargs).run(self.application.connection)
+            ret = self.application.run(self.table.delete(**kwargs))
+            doc_signals.post_delete.send(self.document_class, collection=self, keys=None, results=ret)
+            return ret
 
         if not isinstance(docs, list):
             docs = [docs]
@@ -555,54 +947,296 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
                     p.run_before_delete(value)
 
         values = [v.id if isinstance(v, Document) else v for v in docs]
-        ret = self.table.get_all(*values).delete(**kwargs).run(self.application.connection)
+        ret = self.application.run(self.table.get_all(*values).delete(**kwargs))
         for value in docs:
-            value.post_delete()
+            if isinstance(value, Document):
+                value.post_delete()
+        doc_signals.post_delete.send(self.document_class, collection=self, keys=values, results=ret)
         return ret
 
     def save(self, docs, **kwargs):
         """Save a document or list of documents to the database.
 
+        New documents are inserted, as are documents that were loaded from the database, replacing the stored ones.
+        If the document class turns on ``Document.partial_updates``, loaded documents are updated in place with only
+        the properties that changed since, unless ``conflict='error'`` is passed; if nothing changed, they aren't
+        written at all. If a document was deleted since it was loaded, it is inserted
+        whole. With ``return_changes=True``, updated documents are reloaded from the returned changes.
+
         Args:
             docs (Document or [Document] or [dict]): List of documents to save.
-            **kwargs: Passed to rethinkdb.save
+            **kwargs: Passed to rethinkdb.insert, or for updates, ``durability`` and ``return_changes`` are passed to
+              rethinkdb.update.
 
         Returns:
-            The result of the RethinkDB save.
+            The result of the RethinkDB save. If there were both inserts and updates, their counts are added up.
         """
         if not isinstance(docs, list):
             docs = [docs]
 
-        values = []
+        docs = [doc if isinstance(doc, Document) else self.document_class(doc, collection=self) for doc in docs]
+        docs = [doc.document if isinstance(doc, LazyDocument) else doc for doc in docs]  # save the full document
+        inserts = []
+        updates = []
         doc_signals.pre_save.send(self.document_class, docs=docs)
 
+        partial = kwargs.get('conflict', 'error') != 'error'
         for doc in docs:
-            if not isinstance(doc, Document):
-                doc = self.document_class(doc)
-
             for p in doc.processors:
                 p.run_before_save(doc)
 
             doc.pre_save()   # deprecated. use signals
             doc.validate()
-            doc.saved = True
-            rql = doc.rql_repr()
-            values.append(rql)
+            if partial and doc.saved and doc.partial_updates and self.primary_key in doc.obj:
+                updates.append(doc)
+            else:
+                doc.saved = True
+                inserts.append(doc)
+
+        results = []
+        if inserts:
+            results.append(self.application.run(self.table.insert([doc.rql_repr() for doc in inserts], **kwargs)))
+        changed = [doc for doc in updates if doc.dirty]
+        if changed:
+            results.extend(self._update_changed(changed, **kwargs))
+        ret = _merge_write_results(results, unchanged=len(updates) - len(changed))
+
+        generated_keys = iter(ret.get('generated_keys', ()))
+        inserted = set(id(doc) for doc in inserts)
+        for doc in docs:
+            if id(doc) in inserted and self.primary_key not in doc.obj:
+                doc.id = next(generated_keys)
+                for s in doc.specials.values():
+                    s.post_save(doc)
+            doc.mark_clean()
+            doc.post_save()
+            doc_signals.post_save.send(self.document_class, instance=doc)
+
+        return ret
 
-        ret = self.table.insert(values, **kwargs).run(self.application.connection)
+    def patch(self, keys, patch, **kwargs):
+        """Update properties of documents in the database, without reading the documents first.
 
-        if docs and isinstance(docs[0], Document):
-            for i, doc in enumerate(docs):
-                doc.saved = True
-                if 'generated_keys' in ret:
-                    doc.id = ret['generated_keys'][i]
-                    for s in doc.specials.values():
-                        s.post_save(doc)
-                doc.post_save()
-                doc_signals.post_save.send(self.document_class, instance=doc)
+        Keys of ``patch`` may be dotted paths, which set a property nested inside an object and leave the rest of the
+        object alone. Each value is validated against the schema of the property it sets (see
+        :meth:`validate_patch`) and converted by that property's value handler. Objects replace the value they are
+        set on rather than being merged into it.
+
+        The server-side update sends no ``pre_save`` or ``post_save`` signals and runs no save hooks. So if anything
+        hooks into saving documents of this class (see :meth:`has_save_hooks`), the documents are loaded, changed,
+        and saved with :meth:`save` instead, so that the hooks see the change.
+
+        Either every document is patched or, if any of them don't exist, none are.
 
+        Args:
+            keys: A primary key, or a list of them.
+            patch (dict): Property paths mapped to their new values.
+            **kwargs: ``durability`` and ``return_changes`` are passed to rethinkdb.update.
+
+        Returns:
+            The result of the RethinkDB update.
+
+        Raises:
+            jsonschema.ValidationError: if a value doesn't conform to its property's schema.
+            KeyError: if any of the documents don't exist.
+        """
+        keys = keys if isinstance(keys, list) else [keys]
+        self.validate_patch(patch)
+
+        if self.has_save_hooks():
+            docs = self.get_many(keys, missing='error')
+            for doc in docs:
+                self._apply_patch(doc, patch)
+            return self.save(docs, conflict='replace', **kwargs)
+
+        update_kwargs = {k: v for k, v in kwargs.items() if k in {'durability', 'return_changes'}}
+        ret = self._run_patch(keys, self.table.get_all(*keys).update(self.patch_term(patch), **update_kwargs))
+        return self._patched(keys, ret)
+
+    def patch_many(self, patches, **kwargs):
+        """Apply a different patch to each of several documents, in one query. See :meth:`patch`.
+
+        Either every patch is applied or, if any of the documents don't exist, none are.
+
+        Args:
+            patches (list): Patches, each of which includes the primary key of the document it applies to.
+            **kwargs: ``durability`` and ``return_changes`` are passed to rethinkdb.update.
+
+        Returns:
+            The results of the RethinkDB updates, added up.
+
+        Raises:
+            jsonschema.ValidationError: if a value doesn't conform to its property's schema.
+            KeyError: if any of the documents don't exist.
+        """
+        patches = [dict(p) for p in patches]
+        if any(self.primary_key not in p for p in patches):
+            raise jsonschema.ValidationError("Every patch must include {0}.".format(self.primary_key))
+        keys = [p.pop(self.primary_key) for p in patches]
+
+        if len(patches) == 1:
+            return self.patch(keys[0], patches[0], **kwargs)
+
+        for patch in patches:
+            self.validate_patch(patch)
+
+        if self.has_save_hooks():
+            docs = self.get_many(keys, missing='error')  # all of them, before any is saved
+            for doc, patch in zip(docs, patches):
+                self._apply_patch(doc, patch)
+            return self.save(docs, conflict='replace', **kwargs)
+
+        update_kwargs = {k: v for k, v in kwargs.items() if k in {'durability', 'return_changes'}}
+        queries = [self.table.get_all(k).update(self.patch_term(p), **update_kwargs) for k, p in zip(keys, patches)]
+        return self._patched(keys, _merge_write_results(self._run_patch(keys, r.expr(queries))))
+
+    def _apply_patch(self, doc, patch):
+        """Set the values of a patch on a loaded document."""
+        for path, value in patch.items():
+            k, *rest = path.split('.')
+            if rest:
+                parent = doc[k] if k in doc else {}
+                node = parent
+                for part in rest[:-1]:
+                    node = node.setdefault(part, {})
+                node[rest[-1]] = value
+                value = parent
+            doc[k] = value
+
+    def _run_patch(self, keys, update):
+        """Run an update only if every one of the documents exists, checked in the same query, so that a missing
+        key means nothing is written."""
+        keys = list(OrderedDict.fromkeys(keys))
+        try:
+            return self.application.run(r.branch(
+                self.table.get_all(*keys).count().eq(len(keys)),
+                update,
+                r.error('missing keys')))
+        except r.ReqlUserError:
+            raise KeyError('Some of {0} not found in {1}'.format(', '.join(str(k) for k in keys), self.url))
+
+    def has_save_hooks(self):
+        """True if anything needs to see documents of this class being saved, so they can't be patched in place.
+
+        That is: document processors, ``pre_save`` or ``post_save`` overrides on the document class, value handlers
+        with a ``post_save`` hook, or receivers of the ``pre_save`` or ``post_save`` document signals, other than the
+        ones collections connect to keep their caches and identity maps up to date.
+        """
+        cls = self.document_class
+        if cls.processors or cls.pre_save is not Document.pre_save or cls.post_save is not Document.post_save:
+            return True
+        if any(type(vh).post_save is not ValueHandler.post_save for vh in cls.specials.values()):
+            return True
+        for signal in (doc_signals.pre_save, doc_signals.post_save):
+            if any(not isinstance(getattr(receiver, '__self__', None), Collection)
+                   for receiver in signal.receivers_for(cls)):
+                return True
+        return False
+
+    def _patched(self, keys, ret):
+        """Drop patched documents from the cache and the identity map, and check they were all there."""
+        if self.cache is not None:
+            self.cache.invalidate(*keys)
+        if self.suite.identity_map is not None:
+            self.suite.identity_map.discard(self, *keys)
+
+        if ret.get('replaced', 0) + ret.get('unchanged', 0) < len(set(keys)):
+            raise KeyError('Some of {0} not found in {1}'.format(', '.join(str(k) for k in keys), self.url))
         return ret
 
+    def patch_term(self, patch):
+        """Convert a patch to the argument for RethinkDB's ``update()``. See :meth:`patch`."""
+        context = self.document_class.__new__(self.document_class)  # handlers only need a document for its suite
+        context.collection = self
+
+        term = {}
+        for path, value in patch.items():
+            parts = path.split('.')
+            handler = self.document_class.specials.get(parts[0])
+            for part in parts[1:]:
+                handler = _sub_handler(handler, part, path)
+            if handler is not None:
+                value = handler.to_rql_repr(handler.to_json_repr(value, context, bare_keys=True), context)
+
+            node = term
+            for part in parts[:-1]:
+                node = node.setdefault(part, {})
+                if not isinstance(node, dict):
+                    raise jsonschema.ValidationError("{0} is set and patched at the same time.".format(path))
+            node[parts[-1]] = r.literal(value) if isinstance(value, dict) else value
+        return term
+
+    def validate_patch(self, patch):
+        """Validate each value of a patch against the schema of the property it sets.
+
+        Raises:
+            jsonschema.ValidationError: if a value doesn't conform, or a path doesn't name a property.
+        """
+        for path, value in patch.items():
+            validator = self._property_validators.get(path)
+            if validator is None:
+                validator = self._property_validators[path] = SchemaValidator(self.property_schema(path))
+            validator(value)
+
+    def property_schema(self, path):
+        """Return the schema for the property at a dotted path, with the collection's definitions.
+
+        Raises:
+            jsonschema.ValidationError: if the path goes inside an array, or names a property the schema doesn't allow.
+        """
+        definitions = self.schema.get('definitions', {})
+
+        def resolve(schema):
+            ref = schema.get('$ref')
+            if isinstance(ref, str) and ref.rsplit('/', 1)[-1] in definitions:
+                return definitions[ref.rsplit('/', 1)[-1]]
+            return schema
+
+        schema = self.schema
+        for part in path.split('.'):
+            schema = resolve(schema)
+            if schema.get('type') == 'array':
+                raise jsonschema.ValidationError("{0} can't be patched inside an array.".format(path))
+            properties = schema.get('properties', {})
+            patterns = schema.get('patternProperties', {})
+            if part in properties:
+                schema = properties[part]
+            elif any(re.search(p, part) for p in patterns):
+                schema = next(s for p, s in patterns.items() if re.search(p, part))
+            elif schema.get('additionalProperties', True) is False:
+                raise jsonschema.ValidationError("{0} is not a property of {1}.".format(path, self.url))
+            else:
+                additional = schema.get('additionalProperties')
+                schema = additional if isinstance(additional, dict) else {}
+
+        schema = dict(resolve(schema))
+        schema['definitions'] = definitions
+        return schema
+
+    def _update_changed(self, docs, **kwargs):
+        """Write the changed properties of saved documents, in one query.
+
+        Documents whose rows were deleted since they were loaded are skipped by the update, so they are inserted whole
+        instead, as saving them with ``conflict`` set always did.
+        """
+        update_kwargs = {k: v for k, v in kwargs.items() if k in {'durability', 'return_changes'}}
+        queries = [self.table.get(doc.id).update(doc.rql_changes(), **update_kwargs) for doc in docs]
+        results = self.application.run(queries[0] if len(queries) == 1 else r.expr(queries))
+        if isinstance(results, dict):
+            results = [results]
+
+        if update_kwargs.get('return_changes'):
+            for doc, result in zip(docs, results):
+                for change in result.get('changes', ()):
+                    if change.get('new_val'):
+                        doc._load_row(change['new_val'])
+
+        skipped = [doc for doc, result in zip(docs, results) if result.get('skipped')]
+        if skipped:
+            results = [result for result in results if not result.get('skipped')]
+            results.append(self.application.run(self.table.insert([doc.rql_repr() for doc in skipped], **kwargs)))
+        return results
+
     def json_repr(self, docs, ordered=False, bare_keys=False):
         pop = False
         if not isinstance(docs, list):
@@ -680,7 +1314,7 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
         for p in self.autocomplete_props:
             if reached_limit:
                 break
-            for obj in self.table.filter(lambda x: x[p].match(partial)).run(self.application.connection):
+            for obj in self.application.run(self.table.filter(lambda x: x[p].match(partial))):
                 if obj[pk] not in result:
                     result[obj[pk]] = tpl.format(**obj)
                 if limit and len(result) >= limit:
@@ -704,4 +1338,8 @@ class Collection(MutableMapping, metaclass=CollectionMetaclass):
         response_schema={"type": "object"}
     )
     def key_map(self) -> dict:
-        return {k: str(self[k]) for k in self}
\ No newline at end of file
+        fields = _template_fields(self.document_class.template)
+        query = self.apply_ordering(self.table)
+        if fields is not None:
+            query = query.pluck(self.primary_key, *fields)
+        return OrderedDict((doc.obj[self.primary_key], str(doc)) for doc in self.q(query, partial=fields is not None))
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""An in-process, read-through cache of raw database rows for a :class:`Collection`."""
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+
+
+class DocumentCache(object):
+    """A thread-safe LRU cache of database rows keyed by primary key, with an optional time-to-live.
+
+    Rows are stored as they came out of RethinkDB, and a deep copy is handed out on every hit so that callers can build
+    and modify Document instances without disturbing the cached value.
+
+    Args:
+        max_size (int): The maximum number of rows to keep. The least recently used row is evicted first.
+        ttl (float): Seconds a row stays valid after it is cached. None means rows never expire.
+
+    Attributes:
+        hits (int): The number of lookups that found a valid row.
+        misses (int): The number of lookups that found nothing or an expired row.
+        evictions (int): The number of rows dropped to stay under ``max_size``.
+        invalidations (int): The number of rows dropped because the document was saved or deleted.
+    """
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, key):
+        """True if there is a valid row for key. Doesn't copy the row or count as a use of it."""
+        with self._lock:
+            entry = self._rows.get(key)
+            return entry is not None and (self.ttl is None or entry[1] >= time.monotonic())
+
+    def get(self, key, count=True):
+        """Return a copy of the cached row for key, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._rows.get(key)
+            if entry is not None and self.ttl is not None and entry[1] < time.monotonic():
+                del self._rows[key]
+                entry = None
+
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return None
+
+            self._rows.move_to_end(key)
+            if count:
+                self.hits += 1
+            row = entry[0]
+        return deepcopy(row)
+
+    def put(self, key, row):
+        """Cache a row. The row is copied, so the caller may go on to modify it."""
+        row = deepcopy(row)
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._rows[key] = (row, expires)
+            self._rows.move_to_end(key)
+            while len(self._rows) > self.max_size:
+                self._rows.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *keys):
+        """Drop the rows for the given keys."""
+        with self._lock:
+            for key in keys:
+                if self._rows.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        """Drop every row."""
+        with self._lock:
+            self.invalidations += len(self._rows)
+            self._rows.clear()
+
+    def stats(self):
+        """Counters for tuning ``cache_size`` and ``cache_ttl``."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._rows),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / lookups) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,48 @@
+"""A request-scoped map from primary keys to the documents already loaded.
+
+A single API request can read the same document several times: once to authorize the request, again to act on it, and
+again for every foreign key or reference that points at it. While an :class:`IdentityMap` is open on the suite (see
+:meth:`Suite.open_identity_map`), :meth:`Collection.__getitem__` and :meth:`Collection.get_many` return the instance
+that was loaded first instead of querying again, so every part of the request sees the same object.
+"""
+
+
+class IdentityMap(object):
+    """Documents loaded during one request, by collection and primary key.
+
+    Documents are stored as they are, not copied, so a change made to a document in one place is visible everywhere
+    else in the same request. Saving a document makes it the one in the map; deleting it drops it.
+
+    Attributes:
+        hits (int): The number of lookups that found a document.
+    """
+    def __init__(self):
+        self._documents = {}
+        self.hits = 0
+
+    def __len__(self):
+        return len(self._documents)
+
+    def get(self, collection, key):
+        """Return the document with ``key`` in ``collection``, or None if it hasn't been loaded."""
+        doc = self._documents.get((collection.url, key))
+        if doc is not None:
+            self.hits += 1
+        return doc
+
+    def put(self, document):
+        """Add a saved document to the map, replacing any other instance with the same key."""
+        if document.saved and document.id is not None:
+            self._documents[document.collection.url, document.id] = document
+
+    def discard(self, collection, *keys):
+        """Drop documents from the map. With no keys, drop every document in ``collection``."""
+        if keys:
+            for key in keys:
+                self._documents.pop((collection.url, key), None)
+        else:
+            for k in [k for k in self._documents if k[0] == collection.url]:
+                del self._documents[k]
+
+    def clear(self):
+        self._documents.clear()
@@ -1,3 +1,33 @@
+def projection(fields):
+    """Convert dotted property paths to the arguments for RethinkDB's ``pluck()`` or ``without()``.
+
+    A nested path becomes a nested selector, so ``['name', 'address.city', 'address.zip']`` becomes
+    ``['name', {'address': {'city': True, 'zip': True}}]``. A path that includes another one selects the whole property.
+
+    Args:
+        fields (iterable): Property paths, with nested properties separated by dots.
+
+    Returns:
+        list: Positional arguments for ``pluck()`` or ``without()``.
+    """
+    tree = {}
+    for field in fields:
+        node = tree
+        *parents, leaf = field.split('.')
+        for part in parents:
+            if node.get(part) is True:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[leaf] = True
+
+    args = [k for k, v in tree.items() if v is True]
+    nested = {k: v for k, v in tree.items() if v is not True}
+    if nested:
+        args.append(nested)
+    return args
+
+
 class QWrapper(object):
     """Wraps a rethinkdb query so that we can return instances when we want to and not use the raw interface"""
     def __init__(self, flt, name):
@@ -11,14 +41,21 @@ class QWrapper(object):
 
 
 class QuerySet(object):
-    """Wraps a rethinkdb query so that we can return instances when we want to and not use the raw interface"""
-    def __init__(self, coll):
+    """Wraps a rethinkdb query so that we can return instances when we want to and not use the raw interface
+
+    Args:
+        coll (sondra.collection.Collection): The collection to query.
+        lazy (bool): Return :class:`sondra.document.lazy.LazyDocument` proxies. Defaults to the collection's
+          ``lazy_documents``.
+    """
+    def __init__(self, coll, lazy=None):
         self.coll = coll
         self.query = self.coll.table
         self.result = None
+        self.lazy = lazy
 
     def __getattribute__(self, name):
-        if name.startswith('__') or name in { 'query', 'coll', 'result', 'first', 'drop', 'pop' }:
+        if name.startswith('__') or name in { 'query', 'coll', 'result', 'lazy', 'first', 'drop', 'pop' }:
             return object.__getattribute__(self, name)
         else:
             return QWrapper(self, name)
@@ -30,16 +67,16 @@ class QuerySet(object):
         pass
 
     def __call__(self):
-        return self.coll.q(self.query)
+        return self.coll.q(self.query, lazy=self.lazy)
 
     def __iter__(self):
-        return self.coll.q(self.query)
+        return self.coll.q(self.query, lazy=self.lazy)
 
     def __bool__(self):
         return len(self) > 0
 
     def __len__(self):
-        return self.query.count().run(self.coll.application.connection)
+        return self.coll.application.run(self.query.count())
 
     def drop(self):
         """
@@ -92,19 +129,19 @@ class RawQuerySet(object):
         pass
 
     def __call__(self):
-        return self.query.run(self.coll.application.connection)
+        return self.coll.application.run(self.query)
 
     def __iter__(self):
         if self.cls:
-            return (self.cls(d) for d in self.query.run(self.coll.application.connection))
+            return (self.cls(d) for d in self.coll.application.run(self.query))
         else:
-            return self.query.run(self.coll.application.connection)
+            return self.coll.application.run(self.query)
 
     def __bool__(self):
         return len(self) > 0
 
     def __len__(self):
-        return self.query.count().run(self.coll.application.connection)
+        return self.coll.application.run(self.query.count())
 
     def first(self):
         try:
@@ -13,4 +13,4 @@ pre_table_deletion = signal('collection-pre-table-deletion')
 post_table_deletion = signal('collection-post-table-deletion')
 before_validation = signal('collection-before-validation')
 after_validation = signal('collection-after-validation')
-
+invalidated = signal('collection-invalidated')
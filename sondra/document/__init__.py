@@ -8,9 +8,12 @@ from collections.abc import MutableMapping
 from copy import deepcopy
 
 import jsonschema
+import rethinkdb as r
 
 from sondra.api.expose import method_schema, expose_method_explicit
 from sondra.document.schema_parser import ListHandler, ForeignKey
+from sondra.document.converters import Converters
+from sondra.document.dereference import Dereferencer, foreign_key_properties
 
 try:
     from shapely.geometry import mapping, shape
@@ -95,8 +98,20 @@ class DocumentMetaclass(ABCMeta):
                         for k in cls.schema['properties']
                         if 'default' in cls.schema['properties'][k]}
 
+        # only these processors run on documents loaded from the database. see Document.from_db
+        cls.load_processors = [p for p in cls.processors if getattr(p, 'run_on_load', False)]
+
+        # inherited converters are reused as long as they were compiled from the same specials
+        if getattr(cls, 'converters', None) is None or cls.converters.specials is not cls.specials:
+            cls.converters = Converters(cls.specials)
+
         super(DocumentMetaclass, cls).__init__(name, bases, nmspc)
 
+    def __setattr__(cls, name, value):
+        super(DocumentMetaclass, cls).__setattr__(name, value)
+        if name == 'specials':  # keep the compiled converters in step with the handlers
+            super(DocumentMetaclass, cls).__setattr__('converters', Converters(value))
+
 
 class Document(MutableMapping, metaclass=DocumentMetaclass):
     """
@@ -126,6 +141,18 @@ class Document(MutableMapping, metaclass=DocumentMetaclass):
         metadata (dict): A set of metadata from the database about this object (query-dependent)
         debug_validate_on_retrieval (bool=True): Set at the class derivation level. If when debugging, a validation
             step should happen when documents are retrieved from the database.
+        load_processors (list): The processors that have ``run_on_load`` set, and so also run on documents loaded
+            from the database.
+        converters (sondra.document.converters.Converters): Conversion functions compiled from ``specials``. They are
+            rebuilt whenever ``specials`` is assigned.
+        partial_updates (bool=False): Set at the class derivation level. If True, saving a document that was loaded
+            from the database writes only the properties set or deleted since it was loaded, with ``update()``,
+            instead of replacing the whole document. Defaults filled in on load count as set. Changes made in place
+            inside a property's value, such as appending to a list, aren't noticed, so only turn this on if the
+            class's callers set the property again or call :meth:`mark_dirty` after such changes.
+        cache_converted_values (bool=True): Set at the class derivation level. If True, the Python value of each
+            special property is converted once and kept until the property is set or deleted, so that reading a
+            foreign key or a date more than once doesn't fetch or parse it again. See :meth:`clear_cache`.
     """
     title = None
     defaults = {}
@@ -135,6 +162,8 @@ class Document(MutableMapping, metaclass=DocumentMetaclass):
     specials = {}
     store_nulls = set()
     debug_validate_on_retrieval = False
+    partial_updates = False
+    cache_converted_values = True
 
     def constructor(self, obj):
         """
@@ -185,7 +214,9 @@ class Document(MutableMapping, metaclass=DocumentMetaclass):
         self.collection = collection
         self.saved = from_db
         self.metadata = metadata or {}
-        self.obj = OrderedDict()
+        self._converted = {}
+        self._dirty = set()
+        self.obj = self._new_obj()
 
         if self.collection is not None:
             self.schema = self.collection.schema  # this means it's only calculated once. helpful.
@@ -194,13 +225,142 @@ class Document(MutableMapping, metaclass=DocumentMetaclass):
 
         self._url = None
         self.constructor(obj)
+        if from_db:
+            self._dirty = {k for k in self._dirty if k not in obj}  # defaults the stored row was missing
+
+    @classmethod
+    def from_db(cls, row, collection, metadata=None, partial=False):
+        """Build a document from a row read out of the database.
+
+        Stored documents were already processed when they were saved, so unlike :meth:`constructor` this doesn't set
+        properties one at a time or run every processor after each one. It converts special values, fills in
+        defaults the row is missing, and runs only the processors with ``run_on_load`` set. Classes that override
+        ``__init__`` or ``constructor`` are built the usual way.
+
+        Args:
+            row (dict): The row, as returned by RethinkDB.
+            collection (sondra.collection.Collection): The collection the row came from.
+            metadata (dict): Query metadata for the row, if any.
+            partial (bool=False): Set if the row only holds some of the document's properties, as with ``pluck``.
+              Defaults aren't filled in then, since the stored document may well have the missing properties.
+
+        Returns:
+            Document: a saved document.
+        """
+        if cls.constructor is not Document.constructor or cls.__init__ is not Document.__init__:
+            self = cls(row, collection=collection, from_db=True, metadata=metadata)
+            if partial:
+                defaults = set(cls.defaults) | {k for k, vh in cls.specials.items() if vh.has_default}
+                for k in defaults - set(row):
+                    self.obj.pop(k, None)
+                    self._converted.pop(k, None)
+            return self
+
+        self = cls.__new__(cls)
+        self.collection = collection
+        self.saved = True
+        self.metadata = metadata or {}
+        self.schema = collection.schema
+        self._url = None
+        self._converted = {}
+        self._dirty = set()
+
+        obj = self._load_row(row)
+
+        if collection.primary_key in obj:
+            self._url = '/'.join((collection.url, _reference(obj[collection.primary_key])))
+
+        if not partial:
+            for k in self.defaults:
+                if k not in obj:
+                    if callable(self.defaults[k]):
+                        try:
+                            self[k] = self.defaults[k]()
+                        except:
+                            self[k] = self.defaults[k](self.suite)
+                    else:
+                        self[k] = self.defaults[k]
+
+            for k, vh in self.specials.items():
+                if vh.has_default and k not in obj:
+                    self[k] = vh.default_value()
+
+        for p in self.load_processors:
+            p.run_on_constructor(self)
+
+        if self.debug_validate_on_retrieval and self.suite.debug and not partial:
+            self.validate()
+
+        return self  # defaults and values the load processors filled in stay dirty, so that saving stores them
+
+    def _load_row(self, row):
+        """Replace :attr:`obj` with a row from the database, converting its special values."""
+        obj = self.obj = self._new_obj((k, v) for k, v in row.items() if v is not None or k in self.store_nulls)
+        obj.pop('_url', None)
+        obj.pop('_display_name', None)
+        for k, to_json in self.converters.to_json.items():
+            if obj.get(k) is not None:
+                obj[k] = to_json(obj[k], self, bare_keys=True)
+                if obj[k] is None:
+                    del obj[k]
+
+        self._converted.clear()
+        return obj
+
+    @property
+    def dirty(self):
+        """The set of properties set or deleted since the document was loaded or last saved."""
+        return frozenset(self._dirty)
+
+    def mark_dirty(self, *keys):
+        """Mark properties as changed, for changes made in place that :meth:`__setitem__` didn't see."""
+        self._dirty.update(keys)
+        for key in keys:
+            self._converted.pop(key, None)
+
+    def mark_clean(self):
+        """Forget which properties have changed, as after a save."""
+        self._dirty.clear()
+
+    def rql_changes(self):
+        """The properties that have changed, as an argument to RethinkDB's ``update()``.
+
+        Only the changed properties are converted. Deleted properties are removed with ``r.literal()``, and objects
+        are wrapped in ``r.literal()`` so they replace the stored value instead of being merged into it.
+
+        Returns:
+            dict
+        """
+        changes = {}
+        for k in self._dirty:
+            if k in self.obj:
+                v = self.obj[k]
+                to_rql = self.converters.to_rql.get(k)
+                if to_rql is not None:
+                    v = to_rql(v, self)
+                changes[k] = r.literal(v) if isinstance(v, dict) else v
+            else:
+                changes[k] = r.literal()
+        return changes
+
+    def _new_obj(self, items=()):
+        """Create the mapping that holds this document's properties."""
+        return OrderedDict(items)
 
     def __str__(self):
         return self.template.format(**self.obj)
 
     def refresh(self):
+        identity_map = self.suite.identity_map
+        if identity_map is not None:  # otherwise this would get itself back
+            identity_map.discard(self.collection, self.id)
+
         new = self.collection[self.id]
         self.obj = new.obj
+        self.clear_cache()
+        self.mark_clean()
+        if identity_map is not None:
+            identity_map.put(self)
 
         return self
 
@@ -229,6 +389,8 @@ class Document(MutableMapping, metaclass=DocumentMetaclass):
     @id.setter
     def id(self, v):
         self.obj[self.collection.primary_key] = v
+        self._converted.pop(self.collection.primary_key, None)
+        self._dirty.add(self.collection.primary_key)
         self._url = '/'.join((self.collection.url, v))
 
     @property
@@ -281,30 +443,71 @@ class Document(MutableMapping, metaclass=DocumentMetaclass):
         else:
             raise KeyError(key)
 
-        if key in self.specials:
-            return self.specials[key].to_python_repr(v, self)
-        else:
+        to_python = self.converters.to_python.get(key)
+        if to_python is None:
             return v
+        elif not self.cache_converted_values:
+            return to_python(v, self)
+
+        try:
+            return self._converted[key]
+        except KeyError:
+            value = self._converted[key] = to_python(v, self)
+            return value
+
+    def clear_cache(self, key=None):
+        """Forget converted special values, so they are converted again the next time they are read.
+
+        Call this if a referenced document may have changed since it was first read through this one.
+
+        Args:
+            key (str): The property to forget. If None, forget all of them.
+        """
+        if key is None:
+            self._converted.clear()
+        else:
+            self._converted.pop(key, None)
 
     def __hash__(self):
         return hash(self.id)
 
     def fetch(self, key):
-        """Return the value of the property interpreting it as a reference to another document"""
-        if key in self.obj:
-            if isinstance(self.obj[key], list):
-                return [Reference(self.suite, ref).value for ref in self.obj[key]]
-            elif isinstance(self.obj[key], dict):
-                return {k: Reference(self.suite, ref).value for k, ref in self.obj[key].items()}
-            if self.obj[key] is not None:
-                return Reference(self.suite, self.obj[key]).value
-            else:
-                return None
-        else:
+        """Return the value of the property interpreting it as a reference to another document.
+
+        The documents in a list or dict of references are fetched with one query per collection.
+        """
+        if key not in self.obj:
             raise KeyError(key)
 
+        value = self.obj[key]
+        if value is None:
+            return None
+
+        handler = foreign_key_properties(type(self)).get(key, (None, None))[1]
+        dereferencer = Dereferencer(self.suite)
+
+        def get(ref, token):
+            if token is None:
+                return dereferencer.fetch_one(ref)
+            return dereferencer.get(token)
+
+        if isinstance(value, list):
+            tokens = [(ref, dereferencer.add(ref, handler)) for ref in value]
+            dereferencer.resolve()
+            return [get(ref, token) for ref, token in tokens]
+        elif isinstance(value, dict):
+            tokens = {k: (ref, dereferencer.add(ref, handler)) for k, ref in value.items()}
+            dereferencer.resolve()
+            return {k: get(ref, token) for k, (ref, token) in tokens.items()}
+        else:
+            token = dereferencer.add(value, handler)
+            dereferencer.resolve()
+            return get(value, token)
+
     def __setitem__(self, key, value):
         """Set the value of the property, saving it if it is an unsaved Document instance"""
+        self._converted.pop(key, None)
+        self._dirty.add(key)
         if value is None:
             if key not in self.store_nulls:
                 if key in self.obj:
@@ -313,8 +516,9 @@ class Document(MutableMapping, metaclass=DocumentMetaclass):
                 p.run_after_set(self, key)
         else:
             # if the key needs further processing, e.g. foreign keys, geometry, or dates, process.
-            if key in self.specials:
-                value = self.specials[key].to_json_repr(value, self, bare_keys=True)
+            to_json = self.converters.to_json.get(key)
+            if to_json is not None:
+                value = to_json(value, self, bare_keys=True)
                 if value is None:
                     if key in self.obj:
                         del self.obj[key]
@@ -331,6 +535,8 @@ class Document(MutableMapping, metaclass=DocumentMetaclass):
 
 
     def __delitem__(self, key):
+        self._converted.pop(key, None)
+        self._dirty.add(key)
         del self.obj[key]
         for p in self.processors:
             p.run_after_set(self, key)
@@ -362,8 +568,8 @@ class Document(MutableMapping, metaclass=DocumentMetaclass):
             else:
                 self[k] = v
 
-        self.save()
-        return self.collection[self.id]
+        self.save(return_changes=True)  # loads the stored document from the returned changes
+        return self
 
 
     @expose_method_explicit(
@@ -468,21 +674,30 @@ class Document(MutableMapping, metaclass=DocumentMetaclass):
         return json.dumps(self.json_repr(), *args, **kwargs)
 
     def rql_repr(self):
-        ret = deepcopy(self.obj)
+        """The document as it is stored in RethinkDB.
 
-        value_handlers = self.specials or {}
-        for k, handler in value_handlers.items():
-            if k in ret:
-                ret[k] = handler.to_rql_repr(ret[k], self)
+        Only the special properties are converted, and only the containers on the way to a value that changes are
+        copied. Everything else is shared with :attr:`obj`, so treat the result as read-only below the top level.
 
-        return ret
+        Returns:
+            OrderedDict: A new top-level mapping that can be passed to ReQL.
+        """
+        return self.converters.rql(self.obj, self)
 
     def json_repr(self, ordered=False, bare_keys=False):
-        js = deepcopy(self.obj)
+        """The document as plain JSON-compatible values.
 
-        for property, special in self.specials.items():
-            if property in js:
-                js[property] = special.to_json_repr(js[property], self, bare_keys=bare_keys)
+        Like :meth:`rql_repr`, only the paths that value handlers convert are copied. Setting top-level keys on the
+        result is safe; changing nested values in place also changes the document.
+
+        Args:
+            ordered (bool): Unused; kept for compatibility with :meth:`Collection.json_repr`.
+            bare_keys (bool): Leave foreign keys as ids instead of URLs.
+
+        Returns:
+            OrderedDict: A new top-level mapping.
+        """
+        js = self.converters.json(self.obj, self, bare_keys=bare_keys)
 
         # if ordered:
         #     js = natural_order(js, self.property_order)
@@ -527,7 +742,10 @@ class Document(MutableMapping, metaclass=DocumentMetaclass):
         return ret
 
     def validate(self):
-        jsonschema.validate(self.obj, self.schema)
+        if self.collection is not None:
+            self.collection.schema_validator(self.obj)
+        else:
+            jsonschema.validate(self.obj, self.schema)
 
     @deprecated
     def pre_save(self):
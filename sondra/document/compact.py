@@ -0,0 +1,148 @@
+"""Compact storage for documents in large result sets.
+
+Every :class:`Document` normally keeps its properties in its own ``OrderedDict``, which repeats the hash table and the
+key order for every document. For exports or validation runs over hundreds of thousands of documents, that overhead is
+most of the memory used. A :class:`CompactDocument` instead stores its values in a plain list, indexed by a
+:class:`KeyTable` that all documents of the class share.
+
+To opt in, put :class:`CompactDocument` ahead of the existing document class::
+
+    class CompactTicket(CompactDocument, Ticket):
+        pass
+
+The document behaves the same as a mapping, except that keys iterate in the order the class first saw them
+(schema properties first) rather than the order they were set.
+"""
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from copy import deepcopy
+
+import jsonschema
+
+from sondra.document import Document
+
+_MISSING = object()
+
+
+class KeyTable(object):
+    """An append-only table of property names, shared by every document of a class.
+
+    Args:
+        keys (iterable): Keys to add to the table up front, usually the schema's properties.
+    """
+    def __init__(self, keys=()):
+        self.keys = []
+        self.index = {}
+        self._lock = threading.Lock()
+        for key in keys:
+            self.add(key)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key):
+        """Return the position of a key, adding it to the table if it isn't there."""
+        i = self.index.get(key)
+        if i is None:
+            with self._lock:
+                i = self.index.get(key)
+                if i is None:
+                    i = len(self.keys)
+                    self.keys.append(key)
+                    self.index[key] = i
+        return i
+
+
+class CompactObj(MutableMapping):
+    """A mapping that keeps its values in a list, indexed by a shared :class:`KeyTable`.
+
+    Args:
+        table (KeyTable): The key table shared by every mapping of the same kind.
+        items (iterable): ``(key, value)`` pairs to start with.
+    """
+    __slots__ = ('_table', '_values')
+
+    def __init__(self, table, items=()):
+        self._table = table
+        self._values = []
+        for k, v in items:
+            self[k] = v
+
+    def __getitem__(self, key):
+        i = self._table.index.get(key)
+        if i is None or i >= len(self._values) or self._values[i] is _MISSING:
+            raise KeyError(key)
+        return self._values[i]
+
+    def __setitem__(self, key, value):
+        i = self._table.add(key)
+        values = self._values
+        if i >= len(values):
+            values.extend([_MISSING] * (i + 1 - len(values)))
+        values[i] = value
+
+    def __delitem__(self, key):
+        i = self._table.index.get(key)
+        if i is None or i >= len(self._values) or self._values[i] is _MISSING:
+            raise KeyError(key)
+        self._values[i] = _MISSING
+        while self._values and self._values[-1] is _MISSING:
+            self._values.pop()
+
+    def __contains__(self, key):
+        i = self._table.index.get(key)
+        return i is not None and i < len(self._values) and self._values[i] is not _MISSING
+
+    def __iter__(self):
+        return (k for k, v in zip(self._table.keys, self._values) if v is not _MISSING)
+
+    def __len__(self):
+        return sum(1 for v in self._values if v is not _MISSING)
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, dict(self.items()))
+
+    def copy(self):
+        """A shallow copy, sharing the same key table."""
+        ret = CompactObj(self._table)
+        ret._values = list(self._values)
+        return ret
+
+    def __deepcopy__(self, memo):
+        # copies are made to be serialized or sent to the database, so they come out as ordinary dicts.
+        return OrderedDict((k, deepcopy(v, memo)) for k, v in self.items())
+
+
+class CompactDocument(Document):
+    """A document that stores its properties in a :class:`CompactObj` and creates ``metadata`` only when it's used."""
+
+    @classmethod
+    def key_table(cls):
+        """The key table shared by every document of this class."""
+        table = cls.__dict__.get('_key_table')
+        if table is None:
+            table = KeyTable(cls.schema.get('properties', {}))
+            setattr(cls, '_key_table', table)
+        return table
+
+    def _new_obj(self, items=()):
+        return CompactObj(self.key_table(), items)
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            self._metadata = {}
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value):
+        self._metadata = value or None
+
+    def validate(self):
+        # the schema validators only take a dict for an object.
+        obj = dict(self.obj)
+        if self.collection is not None:
+            self.collection.schema_validator(obj)
+        else:
+            jsonschema.validate(obj, self.schema)
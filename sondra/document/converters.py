@@ -0,0 +1,167 @@
+"""Flat conversion functions generated from a document's value handlers.
+
+:class:`~sondra.document.schema_parser.SchemaParser` describes how to convert a document's special properties as a tree
+of value handlers. Walking that tree means a method call and a ``dict()`` copy for every object, list, and mapping it
+passes through, even when there is nothing to convert on the way. :class:`Converters` walks the tree once instead, and
+generates Python source that does the same work in a single function per direction, with the containers unrolled into
+plain loops and the ``patternProperties`` regexes compiled ahead of time. Only the leaf handlers, such as
+:class:`~sondra.document.schema_parser.DateTime` or :class:`~sondra.document.schema_parser.ForeignKey`, are still
+called.
+
+Every document class has a ``converters`` attribute, which is rebuilt whenever its ``specials`` are assigned. The
+application assigns them when it creates its collections, so this happens once per collection at startup.
+"""
+import re
+from collections import OrderedDict
+
+from sondra.document.schema_parser import ListHandler, PropertyHandler, PropertiesHandler, PatternPropertiesHandler, \
+    KeyValueHandler
+
+DIRECTIONS = ('rql', 'json', 'python')
+
+
+class _Builder(object):
+    """Generate the source of one conversion function."""
+    def __init__(self, direction, namespace):
+        self.direction = direction
+        self.namespace = namespace
+        self.lines = []
+
+    def name(self, prefix):
+        name = '{0}{1}'.format(prefix, len(self.namespace['_names']))
+        self.namespace['_names'].append(name)
+        return name
+
+    def line(self, indent, text):
+        self.lines.append('    ' * indent + text)
+
+    def emit(self, handler, value, indent):
+        """Emit code converting the local variable ``value``, and return the name of the variable holding the result.
+
+        Only the container handlers are unrolled, and only if they are exactly those classes. Anything else, including
+        subclasses, is called as a leaf handler, so overridden behavior is kept.
+        """
+        kind = type(handler)
+        if kind is PropertiesHandler:
+            return self._properties(handler.sub_handlers, value, indent)
+        elif kind is PropertyHandler:
+            return self._properties({handler.prop: handler.sub_handler}, value, indent)
+        elif kind is ListHandler:
+            return self._list(handler.sub_handler, value, indent)
+        elif kind is KeyValueHandler:
+            return self._key_value(handler.sub_handler, value, indent)
+        elif kind is PatternPropertiesHandler:
+            return self._pattern_properties(handler.sub_handlers, value, indent)
+        else:
+            return self._leaf(handler, value, indent)
+
+    def _leaf(self, handler, value, indent):
+        fn = self.name('h')
+        self.namespace[fn] = getattr(handler, 'to_{0}_repr'.format(self.direction))
+        out = self.name('v')
+        args = 'document, **kwargs' if self.direction == 'json' else 'document'
+        self.line(indent, '{0} = {1}({2}, {3})'.format(out, fn, value, args))
+        return out
+
+    def _properties(self, handlers, value, indent):
+        out = self.name('v')
+        self.line(indent, '{0} = {1}'.format(out, value))
+        self.line(indent, 'if {0} is not None:'.format(value))
+        for prop, sub_handler in handlers.items():
+            item = self.name('i')
+            self.line(indent + 1, 'if {0!r} in {1}:'.format(prop, value))
+            self.line(indent + 2, '{0} = {1}[{2!r}]'.format(item, value, prop))
+            converted = self.emit(sub_handler, item, indent + 2)
+            self.line(indent + 2, 'if {0} is {1}:'.format(out, value))  # don't clone until we have to
+            self.line(indent + 3, '{0} = dict({1})'.format(out, value))
+            self.line(indent + 2, '{0}[{1!r}] = {2}'.format(out, prop, converted))
+        return out
+
+    def _list(self, sub_handler, value, indent):
+        out, item = self.name('v'), self.name('i')
+        self.line(indent, '{0} = None'.format(out))
+        self.line(indent, 'if {0} is not None:'.format(value))
+        self.line(indent + 1, '{0} = []'.format(out))
+        self.line(indent + 1, 'for {0} in {1}:'.format(item, value))
+        converted = self.emit(sub_handler, item, indent + 2)
+        self.line(indent + 2, '{0}.append({1})'.format(out, converted))
+        return out
+
+    def _key_value(self, sub_handler, value, indent):
+        out, key, item = self.name('v'), self.name('k'), self.name('i')
+        self.line(indent, '{0} = None'.format(out))
+        self.line(indent, 'if {0}:'.format(value))
+        self.line(indent + 1, '{0} = {{}}'.format(out))
+        self.line(indent + 1, 'for {0}, {1} in {2}.items():'.format(key, item, value))
+        converted = self.emit(sub_handler, item, indent + 2)
+        self.line(indent + 2, '{0}[{1}] = {2}'.format(out, key, converted))
+        return out
+
+    def _pattern_properties(self, handlers, value, indent):
+        out, key, item = self.name('v'), self.name('k'), self.name('i')
+        self.line(indent, '{0} = {1}'.format(out, value))
+        self.line(indent, 'if {0} is not None:'.format(value))
+        self.line(indent + 1, 'for {0}, {1} in {2}.items():'.format(key, item, value))
+        for i, (pattern, sub_handler) in enumerate(handlers.items()):
+            search = self.name('p')
+            self.namespace[search] = re.compile(pattern).search
+            self.line(indent + 2, '{0} {1}({2}):'.format('if' if i == 0 else 'elif', search, key))
+            converted = self.emit(sub_handler, item, indent + 3)
+            self.line(indent + 3, 'if {0} is {1}:'.format(out, value))
+            self.line(indent + 4, '{0} = dict({1})'.format(out, value))
+            self.line(indent + 3, '{0}[{1}] = {2}'.format(out, key, converted))
+        return out
+
+
+class Converters(object):
+    """Conversion functions compiled from a document class's ``specials``.
+
+    Args:
+        specials (dict): Property names mapped to value handlers, as built by
+          :class:`~sondra.document.schema_parser.SchemaParser`.
+
+    Attributes:
+        specials (dict): The handlers these functions were compiled from.
+        rql (callable): ``rql(obj, document)`` returns a shallow copy of ``obj`` with its special properties converted
+          for storage, the same as calling ``to_rql_repr`` on each handler.
+        json (callable): ``json(obj, document, **kwargs)``, likewise for ``to_json_repr``.
+        python (callable): ``python(obj, document)``, likewise for ``to_python_repr``.
+        to_rql (dict): Property names mapped to functions with the same signature as ``ValueHandler.to_rql_repr``.
+        to_json (dict): Likewise for ``to_json_repr``.
+        to_python (dict): Likewise for ``to_python_repr``.
+        source (dict): The generated source of the whole-document function for each direction, for debugging.
+    """
+    def __init__(self, specials):
+        self.specials = specials
+        self.source = {}
+        for direction in DIRECTIONS:
+            setattr(self, direction, self._compile_document(direction))
+            setattr(self, 'to_' + direction, {k: self._compile_property(direction, handler)
+                                              for k, handler in specials.items()})
+
+    def _compile(self, direction, builder, name, source):
+        code = compile(source, '<{0} converter for {1}>'.format(direction, name), 'exec')
+        exec(code, builder.namespace)
+        return builder.namespace[name]
+
+    def _compile_document(self, direction):
+        builder = _Builder(direction, {'OrderedDict': OrderedDict, '_names': []})
+        builder.line(0, 'def convert(obj, document, **kwargs):')
+        builder.line(1, 'ret = OrderedDict(obj.items())')
+        for k, handler in self.specials.items():
+            value = builder.name('i')
+            builder.line(1, 'if {0!r} in ret:'.format(k))
+            builder.line(2, '{0} = ret[{1!r}]'.format(value, k))
+            converted = builder.emit(handler, value, 2)
+            builder.line(2, 'ret[{0!r}] = {1}'.format(k, converted))
+        builder.line(1, 'return ret')
+
+        self.source[direction] = '\n'.join(builder.lines)
+        return self._compile(direction, builder, 'convert', self.source[direction])
+
+    def _compile_property(self, direction, handler):
+        builder = _Builder(direction, {'_names': []})
+        builder.line(0, 'def convert(value, document, **kwargs):')
+        converted = builder.emit(handler, 'value', 1)
+        builder.line(1, 'return {0}'.format(converted))
+        return self._compile(direction, builder, 'convert', '\n'.join(builder.lines))
@@ -0,0 +1,179 @@
+"""Resolve many foreign keys at once.
+
+Reading a foreign key property converts it into the referenced document, which costs one query per reference. When a
+page of results is serialized with its references, that is one query per row per key. A :class:`Dereferencer`
+collects the references first and looks them up with a single ``get_all()`` per target collection, and
+:func:`prefetch` uses it to fill in the converted values of a batch of documents, so that ``doc[key]`` afterwards
+doesn't query the database at all.
+"""
+from collections import OrderedDict
+from itertools import islice
+
+from sondra.api.ref import Reference
+from sondra.document.schema_parser import ForeignKey, ListHandler, KeyValueHandler
+
+
+def foreign_key_properties(document_class):
+    """Return the properties of a document class that hold foreign keys.
+
+    Returns:
+        dict: Property names mapped to ``(shape, handler)``, where ``shape`` is ``'one'``, ``'list'``, or ``'dict'``
+          and ``handler`` is the :class:`~sondra.document.schema_parser.ForeignKey` for the referenced collection.
+    """
+    ret = OrderedDict()
+    for k, handler in document_class.specials.items():
+        if isinstance(handler, ForeignKey):
+            ret[k] = ('one', handler)
+        elif isinstance(handler, ListHandler) and isinstance(handler.sub_handler, ForeignKey):
+            ret[k] = ('list', handler.sub_handler)
+        elif isinstance(handler, KeyValueHandler) and isinstance(handler.sub_handler, ForeignKey):
+            ret[k] = ('dict', handler.sub_handler)
+    return ret
+
+
+class Dereferencer(object):
+    """Collects references to documents and fetches them with one query per collection.
+
+    Call :meth:`add` for every reference, then :meth:`resolve` once, then :meth:`get` for each reference :meth:`add`
+    returned.
+
+    Args:
+        suite (sondra.suite.Suite): The suite the references are relative to.
+    """
+    def __init__(self, suite):
+        self.suite = suite
+        self._wanted = OrderedDict()  # collection url -> (collection, OrderedDict of keys)
+        self._found = {}
+
+    def add(self, value, handler=None):
+        """Add a reference to be fetched.
+
+        Args:
+            value: A document URL, or a bare key if ``handler`` is given.
+            handler (ForeignKey): The handler for the property the value came from, if any.
+
+        Returns:
+            A token to pass to :meth:`get`, or None if the value can't be fetched with the others. Use
+            :meth:`fetch_one` for those.
+        """
+        if not isinstance(value, str):
+            return None
+        elif value.startswith('/') or value.startswith('http'):
+            ref = Reference(self.suite, value)
+            if not ref.is_document():
+                return None
+            coll, key = ref.get_collection(), ref.doc
+        elif handler is not None:
+            coll, key = self.suite[handler.app][handler.coll], value
+        else:
+            return None
+
+        if coll.url not in self._wanted:
+            self._wanted[coll.url] = (coll, OrderedDict())
+        self._wanted[coll.url][1][key] = True
+        return coll.url, key
+
+    def resolve(self):
+        """Fetch everything added since the last call."""
+        for url, (coll, keys) in self._wanted.items():
+            for doc in coll.get_many(list(keys)):
+                self._found[url, doc.id] = doc
+        self._wanted.clear()
+
+    def get(self, token):
+        """Return the document for a token from :meth:`add`.
+
+        Raises:
+            KeyError: if the document wasn't found.
+        """
+        return self._found[token]
+
+    def fetch_one(self, value):
+        """Fetch a reference that :meth:`add` couldn't take, the slow way."""
+        return Reference(self.suite, value).value
+
+
+def _unwrap(doc):
+    """Return the full document for a LazyDocument that has already built one."""
+    return doc._document if getattr(doc, '_document', None) is not None else doc
+
+
+def _stored_value(doc, key):
+    """Return the value of a property as it is stored, or None if it has already been converted."""
+    doc = _unwrap(doc)
+    if key in doc._converted:
+        return None
+    return doc._row.get(key) if hasattr(doc, '_row') else doc.obj.get(key)
+
+
+def prefetch(documents, keys=None):
+    """Load the documents that a batch of documents refers to, with one query per referenced collection.
+
+    Afterwards, reading one of the prefetched properties returns the referenced document(s) without a query. This
+    relies on the document class caching converted values (see ``Document.cache_converted_values``); for classes that
+    don't, it does nothing. References that can't be found are left alone, so reading them fails the same way it
+    would have otherwise.
+
+    Args:
+        documents (list): Documents, possibly of several classes. Anything that isn't a document is ignored.
+        keys (iterable): The properties to prefetch. If None, every foreign key property.
+
+    Returns:
+        list: The documents that were passed in.
+    """
+    from sondra.document import Document
+
+    documents = list(documents)
+    dereferencer = None
+    pending = []
+    for doc in documents:
+        if not isinstance(doc, Document):
+            continue
+        document_class = getattr(doc, 'document_class', type(doc))  # LazyDocuments aren't Document subclasses
+        if not document_class.cache_converted_values:
+            continue
+        for key, (shape, handler) in foreign_key_properties(document_class).items():
+            if keys is not None and key not in keys:
+                continue
+            value = _stored_value(doc, key)
+            if not value:
+                continue
+            if dereferencer is None:
+                dereferencer = Dereferencer(doc.suite)
+
+            if shape == 'one':
+                tokens = dereferencer.add(value, handler)
+            elif shape == 'list':
+                tokens = [dereferencer.add(v, handler) for v in value]
+            else:
+                tokens = {k: dereferencer.add(v, handler) for k, v in value.items()}
+            pending.append((doc, key, shape, tokens))
+
+    if dereferencer is None:
+        return documents
+
+    dereferencer.resolve()
+    for doc, key, shape, tokens in pending:
+        try:
+            if shape == 'one':
+                value = dereferencer.get(tokens)
+            elif shape == 'list':
+                value = [dereferencer.get(t) for t in tokens]
+            else:
+                value = {k: dereferencer.get(t) for k, t in tokens.items()}
+        except KeyError:
+            continue
+        _unwrap(doc)._converted[key] = value
+
+    return documents
+
+
+def prefetch_stream(documents, keys=None, batch_size=100):
+    """Like :func:`prefetch`, but for an iterator of documents, which are prefetched and yielded ``batch_size`` at a
+    time."""
+    documents = iter(documents)
+    while True:
+        batch = list(islice(documents, batch_size))
+        if not batch:
+            return
+        yield from prefetch(batch, keys)
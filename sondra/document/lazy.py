@@ -0,0 +1,203 @@
+"""Proxies for documents read from the database that put off converting special values until they are used.
+
+List endpoints mostly read documents out of the database and serialize them again without looking at them. A
+:class:`LazyDocument` keeps the row RethinkDB returned. It converts a special value only when that property is read,
+and passes every other property straight through to :meth:`LazyDocument.json_repr`. The full document is built only
+when something needs more than that.
+"""
+from collections.abc import MutableMapping
+from copy import deepcopy
+
+from sondra.document import Document, _reference
+
+_HIDDEN = {'_url', '_display_name'}
+
+
+class LazyDocument(MutableMapping):
+    """A stand-in for a document read from the database.
+
+    Reading properties, iterating, and :meth:`json_repr` work directly on the row. Anything else, such as setting a
+    property, saving, updating, or calling a method, builds the full document with :meth:`Document.from_db` and hands off to it
+    from then on. Instances pass ``isinstance(doc, Document)``.
+
+    Use :meth:`can_wrap` to check whether a document class can be proxied. Classes with callable defaults or a custom
+    constructor need to be built in full, and so do rows that a processor has to fill in (see :meth:`can_wrap_row`).
+
+    Args:
+        row (dict): The row, as returned by RethinkDB.
+        collection (sondra.collection.Collection): The collection the row came from.
+        metadata (dict): Query metadata for the row, if any.
+        partial (bool=False): Set if the row only holds some of the document's properties. Defaults aren't filled in.
+
+    Attributes:
+        document (sondra.document.Document): read-only. The full document, built the first time it's needed.
+    """
+    saved = True
+
+    def __init__(self, row, collection, metadata=None, partial=False):
+        self._row = row
+        self._document = None
+        self._converted = {}
+        self.collection = collection
+        self.metadata = metadata or {}
+        self.partial = partial
+
+    @staticmethod
+    def can_wrap(document_class):
+        """True if documents of this class can be proxied without changing how they behave."""
+        return not any(callable(v) for v in document_class.defaults.values()) \
+            and document_class.constructor is Document.constructor \
+            and document_class.__init__ is Document.__init__
+
+    @staticmethod
+    def can_wrap_row(document_class, row):
+        """True if none of the class's processors that run on load would change a document loaded from this row."""
+        return not any(p.needed_on_load(row) for p in document_class.load_processors)
+
+    @property
+    def document(self):
+        if self._document is None:
+            self._document = self.document_class.from_db(
+                self._row, self.collection, metadata=self.metadata, partial=self.partial)
+            self._document._converted.update(self._converted)  # nothing has changed yet, so these are still good
+            self._row = None
+        return self._document
+
+    @property
+    def document_class(self):
+        return self.collection.document_class
+
+    @property
+    def specials(self):
+        return self.document_class.specials
+
+    @property
+    def schema(self):
+        return self.collection.schema
+
+    @property
+    def application(self):
+        return self.collection.application
+
+    @property
+    def suite(self):
+        return self.application.suite
+
+    @property
+    def id(self):
+        if self._document is not None:
+            return self._document.id
+        return self._row.get(self.collection.primary_key)
+
+    @property
+    def url(self):
+        if self._document is not None:
+            return self._document.url
+        return '/'.join((self.collection.url, _reference(self.id)))
+
+    def _present(self, key, value):
+        return (value is not None or key in self.document_class.store_nulls) and key not in _HIDDEN
+
+    @property
+    def _defaults(self):
+        return {} if self.partial else self.document_class.defaults
+
+    def __getitem__(self, key):
+        if self._document is not None:
+            return self._document[key]
+        if isinstance(key, Document):
+            key = key.id
+
+        if key in self._row and self._present(key, self._row[key]):
+            value = self._row[key]
+        elif key in self._defaults:
+            value = self._defaults[key]
+        else:
+            raise KeyError(key)
+
+        to_python = self.document_class.converters.to_python.get(key)
+        if to_python is None:
+            return value
+        elif not self.document_class.cache_converted_values:
+            return to_python(value, self)
+
+        try:
+            return self._converted[key]
+        except KeyError:
+            value = self._converted[key] = to_python(value, self)
+            return value
+
+    def clear_cache(self, key=None):
+        """The same as :meth:`Document.clear_cache`."""
+        if self._document is not None:
+            self._document.clear_cache(key)
+        elif key is None:
+            self._converted.clear()
+        else:
+            self._converted.pop(key, None)
+
+    def __iter__(self):
+        if self._document is not None:
+            return iter(self._document)
+        keys = [k for k, v in self._row.items() if self._present(k, v)]
+        keys.extend(k for k in self._defaults if k not in keys)
+        return iter(keys)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, key):
+        if self._document is not None:
+            return key in self._document
+        return (key in self._row and self._present(key, self._row[key])) or key in self._defaults
+
+    def __setitem__(self, key, value):
+        self.document[key] = value
+
+    def __delitem__(self, key):
+        del self.document[key]
+
+    def __eq__(self, other):
+        if isinstance(other, Document):
+            return self.id and (self.id == other.id)
+        elif isinstance(other, dict):
+            return self.id and (self.id == other[self.collection.primary_key])
+        else:
+            return self.id == other
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        return str(self.document)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.document, name)
+
+    def update(self, *args, **kwargs):
+        """The same as :meth:`Document.update`, which saves the document, not the one from ``MutableMapping``."""
+        return self.document.update(*args, **kwargs)
+
+    def _load_row(self, row):
+        self.document._load_row(row)
+
+    def json_repr(self, ordered=False, bare_keys=False):
+        """The same as :meth:`Document.json_repr`, but only special values are converted."""
+        if self._document is not None:
+            return self._document.json_repr(ordered=ordered, bare_keys=bare_keys)
+
+        js = {k: v for k, v in self._row.items() if self._present(k, v)}
+        for k, default in self._defaults.items():
+            if k not in js:
+                js[k] = deepcopy(default)
+        for k, to_json in self.document_class.converters.to_json.items():
+            if js.get(k) is not None:
+                js[k] = to_json(js[k], self, bare_keys=bare_keys)
+                if js[k] is None:
+                    del js[k]
+        return js
+
+
+Document.register(LazyDocument)
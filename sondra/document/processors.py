@@ -4,7 +4,21 @@ from slugify import slugify
 
 
 class DocumentProcessor(object):
-    """Modify a document based on a condition, such as before it's saved or when a property changes."""
+    """Modify a document based on a condition, such as before it's saved or when a property changes.
+
+    Attributes:
+        run_on_load (bool=False): Documents loaded from the database were already processed when they were saved, so
+          processors don't normally run on them. Set this to also call :meth:`run_on_constructor` on those documents,
+          as processors that fill in missing properties do, for documents saved before the processor was added.
+    """
+    run_on_load = False
+
+    def needed_on_load(self, row):
+        """Override this method to say whether :meth:`run_on_constructor` would change a document loaded from a row.
+
+        Only asked of processors with ``run_on_load`` set. Rows that no processor needs can be loaded lazily.
+        """
+        return True
 
     def is_necessary(self, changed_props):
         """Override this method to determine whether the processor should run."""
@@ -84,9 +98,14 @@ class DeferredDefaults(DocumentProcessor):
     """
     Set defaults for properties where the default value is not valid JSON schema.
     """
+    run_on_load = True  # documents saved before a default was added still need it.
+
     def __init__(self, **defaults):
         self.defaults = defaults
 
+    def needed_on_load(self, row):
+        return any(k not in row for k in self.defaults)
+
     def run_on_constructor(self, document):
         for k, default_value in self.defaults.items():
             if k not in document:
@@ -107,6 +126,7 @@ class DerivedProperty(DocumentProcessor):
         optional_source_props: the source properties that may be None
         derivation: a lambda that receives all
     """
+    run_on_load = True  # documents saved before the property was derived still need it.
 
     def __init__(self, dest_prop, required_source_props=None, optional_source_props=None, modify_existing=True, derivation=join(',')):
         self.dest_prop = dest_prop
@@ -121,6 +141,9 @@ class DerivedProperty(DocumentProcessor):
             if not self.source_props or all([p in document for p in self.required_source_props]):
                 self.run(document)
 
+    def needed_on_load(self, row):
+        return self.modify_existing or self.dest_prop not in row
+
     def run_after_set(self, document, *changed_props):
         if self.modify_existing or not self.dest_prop in document:
             if not self.source_props or (
@@ -158,6 +181,9 @@ class SlugPropertyProcessor(DerivedProperty):
         if (document.get(self.dest_prop, None) is None) and all([p in document for p in self.source_props]):
             self.run(document)
 
+    def needed_on_load(self, row):
+        return row.get(self.dest_prop, None) is None
+
     def run_after_set(self, document, *changed_props):
         if (document.get(self.dest_prop, None) is None) and self.is_necessary(changed_props):
             self.run(document)
@@ -165,10 +191,14 @@ class SlugPropertyProcessor(DerivedProperty):
 
 class TimestampOnUpdate(DocumentProcessor):
     """Stamp a document when it's saved"""
+    run_on_load = True  # documents saved before the processor was added are stamped when they're loaded.
 
     def __init__(self, dest_prop='timestamp'):
         self.dest_prop = dest_prop
 
+    def needed_on_load(self, row):
+        return self.dest_prop not in row
+
     def run_on_constructor(self, document):
         if self.dest_prop not in document:
             self.run(document)
@@ -184,48 +184,31 @@ class PatternPropertiesHandler(ValueHandler):
     def __init__(self, **handler_mapping):
         super(PatternPropertiesHandler, self).__init__(**handler_mapping)
         self.sub_handlers = handler_mapping
+        self._patterns = [(re.compile(pattern).search, handler) for pattern, handler in handler_mapping.items()]
 
-    def to_rql_repr(self, value, document):
+    def _convert(self, value, convert):
         if value is None:
             return None
 
         v = value
-        for pattern in self.sub_handlers:
-            for k, v in value.items():
-                if re.match(pattern, k):
+        for k, item in value.items():
+            for search, handler in self._patterns:
+                if search(k):
                     if v is value:  # don't clone until we have to make a modification
                         v = dict(value)
-
-                v[k] = self.sub_handlers[k].to_rql_repr(v[k], document)
+                    v[k] = convert(handler, item)
+                    break
 
         return v
 
-    def to_json_repr(self, value, document, **kwargs):
-        if value is None:
-            return None
-
-        v = value
-        for pattern in self.sub_handlers:
-            for k, v in value.items():
-                if re.match(pattern, k):
-                    if v is value:  # don't clone until we have to make a modification
-                        v = dict(value)
-
-                v[k] = self.sub_handlers[k].to_json_repr(v[k], document)
+    def to_rql_repr(self, value, document):
+        return self._convert(value, lambda h, item: h.to_rql_repr(item, document))
 
-        return v
+    def to_json_repr(self, value, document, **kwargs):
+        return self._convert(value, lambda h, item: h.to_json_repr(item, document, **kwargs))
 
     def to_python_repr(self, value, document):
-        v = value
-        for pattern in self.sub_handlers:
-            for k, v in value.items():
-                if re.match(pattern, k):
-                    if v is value:  # don't clone until we have to make a modification
-                        v = dict(value)
-
-                v[k] = self.sub_handlers[k].to_python_repr(v[k], document)
-
-        return v
+        return self._convert(value, lambda h, item: h.to_python_repr(item, document))
 
 
 class KeyValueHandler(ValueHandler):
@@ -240,7 +223,7 @@ class KeyValueHandler(ValueHandler):
 
     def to_json_repr(self, value, document, **kwargs):
         if value:
-            return {k: self.sub_handler.to_json_repr(v, document) for k, v in value.items()}
+            return {k: self.sub_handler.to_json_repr(v, document, **kwargs) for k, v in value.items()}
 
     def to_python_repr(self, value, document):
         if value:
@@ -325,8 +308,7 @@ class Geometry(ValueHandler):
         if isinstance(value, BaseGeometry):
             return mapping(value)
         elif '$reql_type$' in value:
-            del value['$reql_type$']
-            return value
+            return {k: v for k, v in value.items() if k != '$reql_type$'}
         else:
             return value
 
@@ -339,7 +321,7 @@ class Geometry(ValueHandler):
         if isinstance(value, BaseGeometry):
             return value
         if '$reql_type$' in value:
-            del value['$reql_type$']
+            return {k: v for k, v in value.items() if k != '$reql_type$'}
         return value
 
 
@@ -456,7 +438,7 @@ class SchemaParser(object):
 
     def _scan_patternProperties_for_specials(self, s):
         if 'patternProperties' in s:
-            handlers = {"[{0}]".format(pname): self._value_handler(pdef) for pname, pdef in s['patternProperties'].items()}
+            handlers = {pname: self._value_handler(pdef) for pname, pdef in s['patternProperties'].items()}
             rem = []
             for k, v in handlers.items():
                 if v is None:
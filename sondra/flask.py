@@ -1,4 +1,4 @@
-from flask import request, Blueprint, current_app, Response, abort
+from flask import request, Blueprint, current_app, Response, abort, stream_with_context
 from flask.ext.cors import CORS
 
 import json
@@ -19,6 +19,12 @@ def init(app):
         CORS(api_tree, intercept_exceptions=True)
 
 
+@api_tree.teardown_request
+def release_connections(exc=None):
+    """Return this thread's database connections to the suite's pools so other requests can use them."""
+    current_app.suite.close_identity_map()
+    current_app.suite.release_connections()
+
 
 @api_tree.route('/schema')
 @api_tree.route(';schema')
@@ -45,6 +51,17 @@ def suite_help():
     )
     return resp
 
+@api_tree.route('/health')
+@api_tree.route(';health')
+def suite_health():
+    health = current_app.suite.connection_health()
+    resp = Response(
+        json.dumps(health, indent=4),
+        status=200 if all(h['healthy'] for h in health.values()) else 503,
+        mimetype='application/json'
+    )
+    return resp
+
 def format_error(req, code, err, reason):
     if isinstance(reason, Exception):
         kind, value, tb = sys.exc_info()
@@ -102,7 +119,7 @@ def format_error(req, code, err, reason):
             response=json.dumps({
                 "err": "InvalidRequest",
                 "reason": reason,
-                "request_data": req.body.decode('utf-8'),
+                "request_data": req.body.decode('utf-8', 'replace'),
                 "request_path": req.reference.url,
                 "method": req.method,
             }, indent=4)
@@ -114,17 +131,23 @@ def api_request(path):
     if request.method == 'HEAD':
         return Response(status=200)
     else:
-        current_app.suite.check_connections()
         args = {k:v for k, v in request.values.items()}
-        r = APIRequest(
-                current_app.suite,
-                request.headers,
-                request.data,
-                request.method,
-                current_app.suite.url + '/' + path,
-                args,
-                request.files
-            )
+        current_app.suite.open_identity_map()  # closed in release_connections, after the response is sent
+        try:
+            r = APIRequest(
+                    current_app.suite,
+                    request.headers,
+                    request.data,
+                    request.method,
+                    current_app.suite.url + '/' + path,
+                    args,
+                    request.files
+                )
+        except ValidationError as invalid_body:
+            return Response(
+                status=400,
+                mimetype='application/json',
+                response=json.dumps({"err": "InvalidRequest", "reason": str(invalid_body)}))
 
         try:
             # Run any number of post-processing steps on this request, including
@@ -139,9 +162,13 @@ def api_request(path):
             r.validate()
 
             mimetype, response = r()
+            if not isinstance(response, (str, bytes)):
+                # keep the request, and this thread's connection, until the whole response is sent.
+                response = stream_with_context(response)
             resp = Response(
                 response=response,
                 status=200,
+                headers=r.response_headers,
                 mimetype=mimetype)
             return resp
 
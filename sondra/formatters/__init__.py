@@ -1,7 +1,9 @@
 __author__ = 'jeff'
 
 from .geojson import GeoJSON
-from .json import JSON
+from .json import JSON, NDJSON
+from .binary import MessagePack, CBOR
+from .arrow import Arrow, Parquet
 from .html import HTML
 from .schema import Schema
 from .help import Help
\ No newline at end of file
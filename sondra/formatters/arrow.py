@@ -0,0 +1,216 @@
+"""Columnar output formats for bulk exports.
+
+Analytical clients usually want a whole collection as a table. Row-oriented JSON repeats every property name in every
+row and sends every number and date as text, which both ends then have to parse. The :class:`Arrow` formatter sends
+an `Arrow IPC stream`_ instead, with column types taken from the collection's schema, and :class:`Parquet` sends a
+Parquet file. Both need `pyarrow`_ to be installed.
+
+Results are always streamed straight from the database cursor, a record batch at a time, so memory use doesn't grow
+with the size of the collection. The first batch is written before the response starts, so that a problem with the
+schema or the arguments is reported with an error status rather than as a truncated file.
+
+.. _Arrow IPC stream: https://arrow.apache.org/docs/format/Columnar.html#ipc-streaming-format
+.. _pyarrow: https://pypi.org/project/pyarrow/
+"""
+from collections.abc import Iterator
+from itertools import chain, islice
+
+from jsonschema import ValidationError
+
+from sondra import document
+from sondra.document.schema_parser import DateTime, ForeignKey, Geometry, ListHandler
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+class _Sink(object):
+    """A write-only file that gives up what has been written to it so far, so that output can be streamed."""
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def readable(self):
+        return False
+
+    def seekable(self):
+        return False
+
+    def drain(self):
+        """Return everything written since the last call."""
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _type_of(schema, handler, definitions):
+    """The Arrow type for a property, and whether its values are sent as JSON text."""
+    if isinstance(handler, DateTime):
+        return pa.timestamp('us', tz='UTC'), False
+    elif isinstance(handler, ForeignKey):
+        return pa.string(), False
+    elif isinstance(handler, ListHandler) and isinstance(handler.sub_handler, ForeignKey):
+        return pa.list_(pa.string()), False
+    elif isinstance(handler, Geometry):
+        return pa.string(), True  # GeoJSON
+
+    if '$ref' in schema:
+        schema = definitions.get(schema['$ref'].rsplit('/', 1)[-1], {})
+    kind = schema.get('type', 'string')
+    if isinstance(kind, list):
+        kind = next((t for t in kind if t != 'null'), 'string')
+
+    if kind == 'string':
+        return pa.string(), False
+    elif kind == 'integer':
+        return pa.int64(), False
+    elif kind == 'number':
+        return pa.float64(), False
+    elif kind == 'boolean':
+        return pa.bool_(), False
+    elif kind == 'array' and handler is None and isinstance(schema.get('items'), dict):
+        item_type, as_json = _type_of(schema['items'], None, definitions)
+        if not as_json:
+            return pa.list_(item_type), False
+    return pa.string(), True  # objects, mixed arrays, and anything else
+
+
+def columns(collection):
+    """Derive the columns of a table of documents from a collection's schema.
+
+    Properties appear in ``propertyOrder`` first, then in the order the schema lists them, with the primary key first
+    if the schema doesn't list it. Date-time properties become UTC timestamps, foreign keys become bare keys, and
+    objects, geometries, and arrays of anything but plain values become JSON text.
+
+    Args:
+        collection (sondra.collection.Collection): The collection.
+
+    Returns:
+        list: ``(name, arrow type, as_json)`` for each column.
+    """
+    properties = collection.schema.get('properties', {})
+    definitions = collection.schema.get('definitions', {})
+    specials = collection.document_class.specials
+
+    names = [n for n in collection.schema.get('propertyOrder', []) if n in properties]
+    names.extend(n for n in properties if n not in names)
+    if collection.primary_key not in properties:
+        names.insert(0, collection.primary_key)
+
+    ret = []
+    for name in names:
+        arrow_type, as_json = _type_of(properties.get(name, {}), specials.get(name), definitions)
+        ret.append((name, arrow_type, as_json))
+    return ret
+
+
+class Arrow(object):
+    """
+    This formats collection results as an Arrow IPC stream. Used when ;format=arrow or ;arrow is a parameter on the last
+    item of a URL.
+
+    Optional arguments:
+
+    * **batch_size** (int) - The number of documents in each record batch. Defaults to 1000.
+    """
+    mimetype = 'application/vnd.apache.arrow.stream'
+    name = 'arrow'
+
+    def __call__(self, reference, results, **kwargs):
+        if pa is None:
+            raise ImportError("The {0} format needs the pyarrow package to be installed.".format(self.name))
+        if reference.kind not in {'collection', 'document'}:
+            raise ValidationError("The {0} format is only available for collections and documents.".format(self.name))
+
+        if isinstance(results, document.Document):
+            results = [results]
+        if not isinstance(results, Iterator) and not (
+                isinstance(results, list) and all(isinstance(d, document.Document) for d in results)):
+            raise ValidationError("The {0} format can only write documents.".format(self.name))
+
+        cols = columns(reference.get_collection())
+        schema = pa.schema([(name, arrow_type) for name, arrow_type, _ in cols])
+        dumps = reference.environment.json_codec.dumps
+        try:
+            batch_size = int(kwargs.get('batch_size', 1000))
+        except (TypeError, ValueError):
+            batch_size = 0
+        if batch_size < 1:
+            raise ValidationError("batch_size must be a positive whole number.")
+
+        output = self.write(schema, self.batches(cols, schema, iter(results), batch_size, dumps), kwargs)
+        first = next(output)  # the header and the first batch, so errors are reported before the response starts
+        return self.mimetype, chain([first], output)
+
+    def batches(self, cols, schema, results, batch_size, dumps):
+        """Read documents ``batch_size`` at a time, and yield each lot as a record batch."""
+        while True:
+            docs = list(islice(results, batch_size))
+            if not docs:
+                return
+
+            rows = [doc.json_repr(bare_keys=True) for doc in docs]
+            arrays = []
+            for name, arrow_type, as_json in cols:
+                if pa.types.is_timestamp(arrow_type):
+                    values = [doc[name] if row.get(name) is not None else None for doc, row in zip(docs, rows)]
+                elif as_json:
+                    values = [dumps(row[name]) if row.get(name) is not None else None for row in rows]
+                else:
+                    values = [row.get(name) for row in rows]
+                arrays.append(pa.array(values, type=arrow_type))
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    def write(self, schema, batches, kwargs):
+        """Write record batches, yielding the output as each one is written."""
+        sink = _Sink()
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+                yield sink.drain()
+        yield sink.drain()
+
+
+class Parquet(Arrow):
+    """
+    This formats collection results as a Parquet file, one row group per record batch. Used when ;format=parquet or
+    ;parquet is a parameter on the last item of a URL.
+
+    Optional arguments:
+
+    * **batch_size** (int) - The number of documents in each row group. Defaults to 1000.
+    * **compression** (str) - The compression codec for the columns. Defaults to ``snappy``.
+    """
+    mimetype = 'application/vnd.apache.parquet'
+    name = 'parquet'
+
+    def write(self, schema, batches, kwargs):
+        sink = _Sink()
+        with pq.ParquetWriter(sink, schema, compression=kwargs.get('compression', 'snappy')) as writer:
+            for batch in batches:
+                writer.write_table(pa.Table.from_batches([batch]))
+                yield sink.drain()
+        yield sink.drain()
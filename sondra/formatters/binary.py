@@ -0,0 +1,141 @@
+"""Binary output formats, for clients that don't need to read the response as text.
+
+`MessagePack`_ and `CBOR`_ encode the same structures as JSON, but numbers are stored as binary, strings aren't escaped,
+and dates are stored as timestamps instead of ISO 8601 strings. Responses are smaller, and quicker to produce and to
+parse. Each format needs its library, ``msgpack`` or ``cbor2``, to be installed.
+
+Requests may send their bodies in either format too, with the matching ``Content-Type`` (see
+:attr:`sondra.api.api_request.APIRequest.body_formats`). Timestamps in request bodies are read as ISO 8601 strings,
+so that a body means the same thing whichever format it was sent in.
+
+.. _MessagePack: https://msgpack.org
+.. _CBOR: https://cbor.io
+"""
+from abc import ABCMeta, abstractmethod
+from datetime import datetime, timezone
+
+from jsonschema import ValidationError
+
+from sondra.document import Document
+from sondra.document.schema_parser import DateTime
+from sondra.utils import mapjson
+from .json import JSON
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class Binary(JSON, metaclass=ABCMeta):
+    """Base class for binary formats. Takes the same optional arguments as :class:`sondra.formatters.JSON`, except for
+    **indent**.
+
+    Date-time properties are sent as timestamps; naive datetimes are taken to be in UTC. Geometries are sent as GeoJSON
+    objects. Subclasses set ``library`` to the module they need, or None if it isn't installed, and implement
+    :meth:`decode`.
+    """
+    library = None
+    name = None
+
+    def __call__(self, reference, results, **kwargs):
+        if self.library is None:
+            raise ImportError("The {0} format needs the {0} package to be installed.".format(self.name))
+        kwargs.pop('indent', None)
+        return super(Binary, self).__call__(reference, results, **kwargs)
+
+    def document_repr(self, doc, ordered=False, bare_keys=False):
+        ret = doc.json_repr(ordered=ordered, bare_keys=bare_keys)
+        for k, handler in doc.specials.items():
+            if isinstance(handler, DateTime) and ret.get(k) is not None:
+                ret[k] = doc[k]  # the converted value is cached on the document
+        return ret
+
+    @abstractmethod
+    def decode(self, body):
+        """Decode a request body with ``library``."""
+
+    def loads(self, body):
+        """Decode a request body. Timestamps are read as ISO 8601 strings.
+
+        Raises:
+            jsonschema.ValidationError: if ``library`` isn't installed or the body can't be decoded.
+        """
+        if self.library is None:
+            raise ValidationError("{0} request bodies need the {0} package to be installed.".format(self.name))
+        try:
+            return mapjson(_isoformat, self.decode(body))
+        except Exception as e:  # each library has its own decoding errors
+            raise ValidationError("Invalid {0} request body: {1}".format(self.name, str(e) or e.__class__.__name__))
+
+
+class MessagePack(Binary):
+    """
+    This formats the API output as MessagePack. Used when ;format=msgpack or ;msgpack is a parameter on the last item of
+    a URL. Dates use MessagePack's timestamp extension type.
+
+    A streamed response is a sequence of MessagePack objects, one per document, rather than a single array, since
+    MessagePack arrays must give their length up front. Use ``msgpack.Unpacker`` to read it.
+    """
+    mimetype = 'application/msgpack'
+    library = msgpack
+    name = 'msgpack'
+
+    def encoder(self, reference, default, **kwargs):
+        def encode(obj):
+            if isinstance(obj, datetime):  # only naive datetimes get here
+                return msgpack.Timestamp.from_datetime(obj.replace(tzinfo=timezone.utc))
+            return default(obj)
+
+        return msgpack.Packer(default=encode, datetime=True).pack
+
+    def stream(self, results, dumps):
+        for result in results:
+            yield dumps(result)
+
+    def decode(self, body):
+        return msgpack.unpackb(body, raw=False, timestamp=3)
+
+
+class CBOR(Binary):
+    """
+    This formats the API output as CBOR. Used when ;format=cbor or ;cbor is a parameter on the last item of a URL. Dates
+    are tagged epoch timestamps.
+
+    A streamed response is a single indefinite-length array.
+    """
+    mimetype = 'application/cbor'
+    library = cbor2
+    name = 'cbor'
+
+    def encoder(self, reference, default, **kwargs):
+        def encode(encoder, obj):
+            encoder.encode(default(obj))
+
+        def serialize(obj):
+            return default(obj) if isinstance(obj, Document) else obj
+
+        # cbor2 encodes anything that looks like a mapping as one, without calling default, so documents are serialized
+        # before encoding.
+        def dumps(obj):
+            return cbor2.dumps(mapjson(serialize, obj), default=encode, datetime_as_timestamp=True,
+                               timezone=timezone.utc)
+        return dumps
+
+    def stream(self, results, dumps):
+        yield b'\x9f'
+        for result in results:
+            yield dumps(result)
+        yield b'\xff'
+
+    def decode(self, body):
+        return cbor2.loads(body)
@@ -1,5 +1,3 @@
-import json
-
 from sondra import collection, document
 from sondra.document.schema_parser import Geometry
 from sondra.utils import mapjson
@@ -46,4 +44,4 @@ class GeoJSON(object):
             }
         else:
             ret = result
-        return 'application/json', json.dumps(ret, indent=4)
\ No newline at end of file
+        return 'application/json', reference.environment.json_codec.dumps(ret, indent=kwargs.get('indent', 4))
\ No newline at end of file
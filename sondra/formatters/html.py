@@ -1,6 +1,8 @@
 import json
+from collections.abc import Iterator
 
 from sondra import document
+from sondra.document.dereference import prefetch, prefetch_stream
 from sondra.utils import mapjson
 from sondra.api.ref import Reference
 from io import StringIO
@@ -12,7 +14,8 @@ class HTML(object):
     Optional arguments:
 
     * **indent** (int) - Formats the JSON output for human reading by inserting newlines and indenting ``indent`` spaces.
-    * **fetch** (string) - A key in the document. Fetches the sub-document(s) associated with that key.
+    * **fetch** (string) - A key in the document, or several separated by commas. Fetches the sub-document(s)
+      associated with that key, with one query per referenced collection for the whole result.
     * **ordered** (bool) - Sorts the keys in dictionary order.
     * **bare_keys** (bool) - Sends bare foreign keys instead of URLs.
     """
@@ -100,6 +103,15 @@ class HTML(object):
         else:
             fetch = []
 
+        # look up every referenced document in one query per collection, rather than one per reference.
+        if fetch:
+            if isinstance(results, Iterator):
+                results = prefetch_stream(results, fetch)
+            elif isinstance(results, list):
+                prefetch(results, fetch)
+            elif isinstance(results, document.Document):
+                prefetch([results], fetch)
+
         if 'bare_keys' in kwargs:
             bare_keys = bool(kwargs.get('bare_keys', False))
             del kwargs['bare_keys']
@@ -1,7 +1,8 @@
-import json
+from collections.abc import Iterator
+from functools import partial
 
 from sondra import document
-from sondra.utils import mapjson
+from sondra.document.dereference import prefetch, prefetch_stream
 from sondra.api.ref import Reference
 from datetime import datetime
 
@@ -30,10 +31,14 @@ class JSON(object):
     Optional arguments:
 
     * **indent** (int) - Formats the JSON output for human reading by inserting newlines and indenting ``indent`` spaces.
-    * **fetch** (string) - A key in the document. Fetches the sub-document(s) associated with that key.
+    * **fetch** (string) - A key in the document, or several separated by commas. Fetches the sub-document(s)
+      associated with that key, with one query per referenced collection for the whole result.
     * **ordered** (bool) - Sorts the keys in dictionary order.
     * **bare_keys** (bool) - Sends bare foreign keys instead of URLs.
+    * **stream** (bool) - Streams collection results as they are read from the database instead of building the whole
+      response first.
     """
+    mimetype = 'application/json'
     # TODO make dotted keys work in the fetch parameter.
 
     def __call__(self, reference, results, **kwargs):
@@ -55,33 +60,93 @@ class JSON(object):
         else:
             fetch = []
 
+        # look up every referenced document in one query per collection, rather than one per reference.
+        if fetch:
+            if isinstance(results, Iterator):
+                results = prefetch_stream(results, fetch)
+            elif isinstance(results, list):
+                prefetch(results, fetch)
+            elif isinstance(results, document.Document):
+                prefetch([results], fetch)
+
         if 'bare_keys' in kwargs:
             bare_keys = bool(kwargs.get('bare_keys', False))
             del kwargs['bare_keys']
         else:
             bare_keys = False
 
-        print(bare_keys)
-
         # note this is a closure around the fetch parameter. Consider before refactoring out of the method.
         def serialize(doc):
             if isinstance(doc, document.Document):
-                ret = doc.json_repr(ordered=ordered, bare_keys=bare_keys)
+                ret = self.document_repr(doc, ordered=ordered, bare_keys=bare_keys)
                 for f in fetch:
                     if f in ret:
                         if isinstance(doc[f], list):
-                            ret[f] = [d.json_repr(ordered=ordered, bare_keys=bare_keys) for d in doc[f]]
+                            ret[f] = [self.document_repr(d, ordered=ordered, bare_keys=bare_keys) for d in doc[f]]
                         elif isinstance(doc[f], dict):
-                            ret[f] = {k: v.json_repr(ordered=ordered, bare_keys=bare_keys) for k, v in doc[f].items()}
+                            ret[f] = {k: self.document_repr(v, ordered=ordered, bare_keys=bare_keys)
+                                      for k, v in doc[f].items()}
                         else:
-                            ret[f] = doc[f].json_repr(ordered=ordered, bare_keys=bare_keys)
+                            ret[f] = self.document_repr(doc[f], ordered=ordered, bare_keys=bare_keys)
                 return ret
             else:
                 return doc
 
-        result = mapjson(serialize, results)  # make sure to serialize a full Document structure if we have one.
+        # the encoder calls back for anything it can't encode itself, so documents are serialized in the same pass as
+        # everything else, wherever they are in the result.
+        serial = json_serial(bare_keys=bare_keys)
+
+        def default(obj):
+            return serialize(obj) if isinstance(obj, document.Document) else serial(obj)
 
+        dumps = self.encoder(reference, default, **kwargs)
+
+        if isinstance(results, Iterator):  # a cursor. serialize documents as they arrive instead of all at once.
+            return self.mimetype, self.stream(results, dumps)
+        else:
+            return self.mimetype, self.write(serialize(results), dumps)
+
+    def document_repr(self, doc, ordered=False, bare_keys=False):
+        """The representation of a document to encode."""
+        return doc.json_repr(ordered=ordered, bare_keys=bare_keys)
+
+    def encoder(self, reference, default, **kwargs):
+        """Return a function that encodes one value, calling ``default`` for values it can't encode itself."""
+        return partial(reference.environment.json_codec.dumps, default=default, **kwargs)
+
+    def write(self, result, dumps):
+        """Serialize a complete result."""
         if not (isinstance(result, dict) or isinstance(result, list)):
             result = {"_": result}
+        return dumps(result)
+
+    def stream(self, results, dumps):
+        """Serialize results one at a time as an array, yielding each piece of the output as it is ready."""
+        yield '['
+        for i, result in enumerate(results):
+            yield (',' if i else '') + dumps(result)
+        yield ']'
+
+
+class NDJSON(JSON):
+    """
+    This formats the API output as `newline delimited JSON`_, one document per line. Used when ;format=ndjson or
+    ;ndjson is a parameter on the last item of a URL. Collection results are always streamed.
+
+    Takes the same optional arguments as :class:`JSON`, except for **indent**.
+
+    .. _newline delimited JSON: http://ndjson.org
+    """
+    mimetype = 'application/x-ndjson'
+
+    def __call__(self, reference, results, **kwargs):
+        kwargs.pop('indent', None)
+        return super(NDJSON, self).__call__(reference, results, **kwargs)
+
+    def write(self, result, dumps):
+        results = result if isinstance(result, list) else [result]
+        return ''.join(dumps(r) + '\n' for r in results)
 
-        return 'application/json', json.dumps(result, default=json_serial(bare_keys=bare_keys), **kwargs)
\ No newline at end of file
+    def stream(self, results, dumps):
+        for result in results:
+            yield dumps(result) + '\n'
@@ -1,5 +1,3 @@
-import json
-
 from sondra.api.expose import method_schema
 
 
@@ -20,8 +18,9 @@ class Schema(object):
 
         if 'method' in reference.kind:
             # ordered_schema = natural_order(method_schema(*reference.value))
-            return 'application/json', json.dumps(method_schema(*reference.value), **kwargs)
+            return 'application/json', reference.environment.json_codec.dumps(
+                method_schema(*reference.value), **kwargs)
         else:
             # ordered_schema = natural_order(reference.value.schema)
-            return 'application/json', json.dumps(reference.value.schema, **kwargs)
+            return 'application/json', reference.environment.json_codec.dumps(reference.value.schema, **kwargs)
 
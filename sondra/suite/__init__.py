@@ -8,13 +8,20 @@ import rethinkdb as r
 import logging
 import logging.config
 import os
+import threading
 
 from jsonschema import Draft4Validator
 
 from sondra import help
+from sondra.codecs import json_codec
+from sondra.api.expose import method_schema
 from sondra.api.ref import Reference
 from sondra.schema import merge
+from sondra.validation import SchemaValidator
 from . import signals
+from .connections import ConnectionPool, ConnectionMonitor
+from .invalidation import InvalidationBus
+from sondra.collection.identity import IdentityMap
 
 CSS_PATH = os.path.join(os.getcwd(), 'static', 'css', 'help.css')
 DOCSTRING_PROCESSORS = {}
@@ -155,10 +162,24 @@ class Suite(Mapping, metaclass=SuiteMetaclass):
         base_url_scheme (str): http or https, automatically set.
         base_url_netloc (str): automatically set hostname of the suite.
         connection_config (dict): For each key in connections setup keyword args to be passed to `rethinkdb.connect()`
-        connections (dict): RethinkDB connections for each key in ``connection_config``
+        connection_pool_config (dict): Keyword args for :class:`ConnectionPool` (``min_size``, ``max_size``,
+            ``idle_timeout``, ``checkout_timeout``). A key in ``connection_config`` may override these with a
+            ``pool`` sub-dict.
+        connections (dict): A :class:`ConnectionPool` for each key in ``connection_config``
+        connection_check_interval (float=30): Seconds between background connection health checks. None disables the
+            background :class:`ConnectionMonitor`.
+        invalidation_feeds (bool=False): Follow RethinkDB changefeeds on every cached collection so that writes from
+            other processes drop stale documents from this process's caches. See :class:`InvalidationBus`.
+        invalidation_bus (InvalidationBus): The bus, or None if ``invalidation_feeds`` is off.
+        identity_maps (bool=True): Keep an :class:`IdentityMap` for each API request, so that each document is loaded
+            at most once per request. See :meth:`open_identity_map`.
+        identity_map (IdentityMap): read-only. The current thread's identity map, or None outside a request.
         docstring_processor_name (str): Any member of DOCSTRING_PROCESSORS: ``preformatted``, ``rst``, ``markdown``,
             ``google``, or ``numpy``.
         docstring_processor (callable): A ``lambda (str)`` that returns HTML for a docstring.
+        json_codec_name (str): Any member of ``sondra.codecs.JSON_CODECS``: ``json``, or ``orjson`` if it is
+            installed. None uses the fastest one installed.
+        json_codec: The codec that API requests are parsed and responses are encoded with.
         logging (dict): A dict-config for logging.
         log (logging.Logger): A logger object configured with the above dictconfig.
         cross_origin (bool=False): Allow cross origin API requests from the browser.
@@ -176,6 +197,7 @@ class Suite(Mapping, metaclass=SuiteMetaclass):
     logging = None
     log_level = None
     docstring_processor_name = 'preformatted'
+    json_codec_name = None
     cross_origin = False
     allow_anonymous_formats = {'help', 'schema'}
     api_request_processors = ()
@@ -183,6 +205,15 @@ class Suite(Mapping, metaclass=SuiteMetaclass):
     connection_config = {
         'default': {}
     }
+    connection_pool_config = {
+        'min_size': 1,
+        'max_size': 10,
+        'idle_timeout': 300,
+        'checkout_timeout': 30,
+    }
+    connection_check_interval = 30
+    invalidation_feeds = False
+    identity_maps = True
     working_directory = os.getcwd()
     language = 'en'
     translations = None
@@ -216,8 +247,12 @@ class Suite(Mapping, metaclass=SuiteMetaclass):
 
     def __init__(self, db_prefix=""):
         self.applications = {}
+        self._method_validators = {}
         self.connections = None
+        self.connection_monitor = None
+        self.invalidation_bus = None
         self.db_prefix = db_prefix
+        self._identity = threading.local()
 
         if self.logging:
             logging.config.dictConfig(self.logging)
@@ -234,11 +269,21 @@ class Suite(Mapping, metaclass=SuiteMetaclass):
         for name in self.connections:
             self.log.info("Connection established to '{0}'".format(name))
 
+        if self.connection_check_interval:
+            self.connection_monitor = ConnectionMonitor(self, self.connection_check_interval)
+            self.connection_monitor.start()
+
+        if self.invalidation_feeds:
+            self.invalidation_bus = InvalidationBus(self)
+
         self.log.info("Suite base url is: '{0}".format(self.url))
 
         self.docstring_processor = DOCSTRING_PROCESSORS[self.docstring_processor_name]
         self.log.info('Docstring processor is {0}')
 
+        self.json_codec = json_codec(self.json_codec_name)
+        self.log.info('JSON codec is {0}'.format(self.json_codec.name))
+
         self.log.info('Default language is {0}'.format(self.language))
         self.log.info('Translations for default language are {0}'.format('present' if self.translations else 'not present'))
 
@@ -247,14 +292,72 @@ class Suite(Mapping, metaclass=SuiteMetaclass):
         signals.post_init.send(self.__class__, instance=self)
 
     def check_connections(self):
-        for name, conn in self.connections.items():
-            try:
-                r.db_list().run(conn)
-            except r.ReqlDriverError as e:
-                self.connections[name] = r.connect(**self.connection_config[name])
+        """Check every connection pool now instead of waiting for the background monitor.
+
+        Returns:
+            bool: True if every pool could reach its server.
+        """
+        return all([pool.check() for pool in self.connections.values()])
+
+    def method_request_validator(self, instance, method):
+        """Return the compiled validator for a method's request schema, compiling it the first time it's asked for.
+
+        Methods on documents share a validator per collection.
+
+        Args:
+            instance: The suite, application, collection, or document the method is bound to. May be None.
+            method: The exposed method.
+
+        Returns:
+            sondra.validation.SchemaValidator
+        """
+        from sondra.document import Document
+
+        scope = instance.collection if isinstance(instance, Document) else instance
+        key = (id(scope), getattr(method, '__func__', method))
+        validator = self._method_validators.get(key)
+        if validator is None:
+            validator = SchemaValidator(method_schema(instance, method)['definitions']['method_request'])
+            self._method_validators[key] = validator
+        return validator
+
+    def connection_health(self):
+        """The health of each connection pool, keyed by connection name."""
+        return {name: pool.health() for name, pool in self.connections.items()}
 
     def connect(self):
-        self.connections = {name: r.connect(**kwargs) for name, kwargs in self.connection_config.items()}
+        if self.connections:
+            for pool in self.connections.values():
+                pool.close()
+
+        self.connections = {}
+        for name, kwargs in self.connection_config.items():
+            kwargs = dict(kwargs)
+            pool_kwargs = dict(self.connection_pool_config)
+            pool_kwargs.update(kwargs.pop('pool', {}))
+            self.connections[name] = ConnectionPool(**pool_kwargs, **kwargs)
+
+    @property
+    def identity_map(self):
+        return getattr(self._identity, 'map', None)
+
+    def open_identity_map(self):
+        """Start a new identity map for the current thread. Call at the start of a request.
+
+        Returns:
+            IdentityMap: The new map, or None if ``identity_maps`` is off.
+        """
+        self._identity.map = IdentityMap() if self.identity_maps else None
+        return self._identity.map
+
+    def close_identity_map(self):
+        """Drop the current thread's identity map and the documents in it. Call at the end of a request."""
+        self._identity.map = None
+
+    def release_connections(self):
+        """Return every connection the current thread has checked out to its pool. Call at the end of a request."""
+        for pool in self.connections.values():
+            pool.release()
 
     def register_application(self, app):
         """This is called automatically whenever an Application object is constructed."""
@@ -0,0 +1,324 @@
+"""Connection pooling for RethinkDB connections.
+
+A :class:`Suite` keeps one :class:`ConnectionPool` per entry in its ``connection_config``. Each thread checks a
+connection out of the pool the first time it asks for one and keeps it until :meth:`ConnectionPool.release` is
+called, which is done at the end of every API request. This lets concurrent requests run their queries in parallel
+instead of serializing them on a single socket.
+
+Connection liveness is checked in the background by a :class:`ConnectionMonitor` rather than on every request. If a
+connection dies between checks, :meth:`ConnectionPool.run` discards it, and retries the query once on a fresh one if
+running it again can't change anything.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+import rethinkdb as r
+
+
+# terms that change the database or the outside world. A query containing any of them is never retried.
+_WRITE_TERMS = tuple(getattr(r.ast, name) for name in (
+    'Insert', 'Update', 'Replace', 'Delete', 'Sync',
+    'DbCreate', 'DbDrop', 'TableCreate', 'TableCreateTL', 'TableDrop', 'TableDropTL',
+    'IndexCreate', 'IndexDrop', 'IndexRename', 'Reconfigure', 'Rebalance', 'Grant', 'GrantTL',
+    'JavaScript', 'Http',
+) if hasattr(r.ast, name))
+
+
+def _is_read_only(query):
+    """True if a ReQL query contains no terms that write."""
+    if isinstance(query, _WRITE_TERMS):
+        return False
+    return all(_is_read_only(arg) for arg in getattr(query, 'args', ())) and \
+        all(_is_read_only(arg) for arg in getattr(query, 'optargs', {}).values())
+
+
+class ConnectionPoolExhausted(Exception):
+    """Raised when no connection could be checked out of a pool before the checkout timeout expired."""
+
+
+class ConnectionPool(object):
+    """A thread-safe pool of RethinkDB connections.
+
+    Args:
+        min_size (int=1): The number of connections to open up front and keep open even when idle.
+        max_size (int=10): The maximum number of connections, idle or checked out, that the pool will open.
+        idle_timeout (float=300): Seconds an idle connection may sit in the pool before it is closed. Connections are
+          never reaped below ``min_size``.
+        checkout_timeout (float=30): Seconds to wait for a connection when the pool is at ``max_size``. None waits
+          forever.
+        **connect_kwargs: Keyword arguments passed to ``rethinkdb.connect()``.
+
+    Attributes:
+        in_use (int): read-only. The number of connections currently checked out.
+        size (int): read-only. The number of open connections, idle or checked out.
+        healthy (bool): False if the last health check or query could not reach the server.
+        last_checked (float): ``time.time()`` of the last health check, or None.
+        last_error (str): The last connection error seen, or None.
+    """
+    def __init__(self, min_size=1, max_size=10, idle_timeout=300, checkout_timeout=30, **connect_kwargs):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError("Connection pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.connect_kwargs = connect_kwargs
+        self.log = logging.getLogger(self.__class__.__name__)
+
+        self._idle = deque()  # (connection, time returned to the pool), most recently used at the right
+        self._in_use = set()
+        self._pending = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+        self.healthy = True
+        self.last_checked = None
+        self.last_error = None
+
+        for _ in range(self.min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        return r.connect(**self.connect_kwargs)
+
+    @property
+    def in_use(self):
+        return len(self._in_use)
+
+    @property
+    def size(self):
+        return len(self._idle) + len(self._in_use) + self._pending
+
+    @property
+    def connection(self):
+        """The connection checked out by the current thread. Checks one out if the thread doesn't have one yet."""
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None and not conn.is_open():
+            self.release(broken=True)
+            conn = None
+        if conn is None:
+            conn = self._local.connection = self.acquire()
+        return conn
+
+    def run(self, query, **kwargs):
+        """Run a query on the current thread's connection.
+
+        A connection found closed before the query is sent is replaced first. If the connection is lost while the query
+        runs, it is discarded, and a read-only query is retried once on a fresh connection. A query that writes is not
+        retried, since it may already have been applied before the reply was lost, and the error is raised. So is any
+        error on a connection that is still open.
+
+        Args:
+            query (ReQL): The query to run.
+            **kwargs: Passed to ``query.run()``.
+
+        Returns:
+            The result of the query.
+        """
+        conn = self.connection
+        try:
+            return query.run(conn, **kwargs)
+        except r.ReqlDriverError as e:
+            if conn.is_open():
+                raise
+            self.release(broken=True)
+            if not _is_read_only(query):
+                self.healthy = False
+                self.last_error = str(e)
+                raise
+            self.log.warning("Connection lost, reconnecting: {0}".format(e))
+            try:
+                ret = query.run(self.connection, **kwargs)
+            except r.ReqlDriverError as e:
+                self.healthy = False
+                self.last_error = str(e)
+                raise
+            self.healthy = True
+            return ret
+
+    def check(self):
+        """Ping every idle connection, close the ones that are dead, and top the pool back up to ``min_size``.
+
+        Connections that are checked out are left alone; they belong to the thread using them.
+
+        Returns:
+            bool: True if the server could be reached.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+
+        alive = deque()
+        error = None
+        for conn, returned in idle:
+            try:
+                r.expr(1).run(conn)
+                alive.append((conn, returned))
+            except r.ReqlDriverError as e:
+                error = e
+                self._close(conn)
+
+        with self._available:
+            alive.extend(self._idle)  # anything returned while we were checking is newer
+            self._idle = alive
+            missing = self.min_size - self.size
+            self._available.notify_all()
+
+        if missing > 0 or (error is not None and not alive):
+            try:
+                for _ in range(max(missing, 1)):
+                    self._add_idle(self._connect())
+                error = None
+            except r.ReqlDriverError as e:
+                error = e
+        elif alive:
+            error = None  # some connections died, but the server is reachable
+
+        self.last_checked = time.time()
+        self.healthy = error is None
+        self.last_error = str(error) if error is not None else None
+        if error is not None:
+            self.log.error("Connection check failed: {0}".format(error))
+        return self.healthy
+
+    def health(self):
+        """A summary of the state of this pool, suitable for serializing as JSON."""
+        return {
+            "healthy": self.healthy,
+            "size": self.size,
+            "in_use": self.in_use,
+            "idle": len(self._idle),
+            "last_checked": self.last_checked,
+            "last_error": self.last_error,
+        }
+
+    def acquire(self):
+        """Check a connection out of the pool, opening a new one if there are no idle connections.
+
+        Returns:
+            A RethinkDB connection. The caller is responsible for returning it with :meth:`put`.
+
+        Raises:
+            ConnectionPoolExhausted if ``max_size`` connections are in use for longer than ``checkout_timeout``.
+        """
+        deadline = None if self.checkout_timeout is None else time.monotonic() + self.checkout_timeout
+        with self._available:
+            while not self._idle and self.size >= self.max_size:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise ConnectionPoolExhausted(
+                        "All {0} connections are in use.".format(self.max_size))
+                self._available.wait(remaining)
+
+            if self._idle:
+                conn, _ = self._idle.pop()
+                self._in_use.add(conn)
+                return conn
+            self._pending += 1  # reserve the slot while we connect outside the lock
+
+        conn = None
+        try:
+            conn = self._connect()
+        finally:
+            with self._available:
+                self._pending -= 1
+                if conn is None:
+                    self._available.notify()
+                else:
+                    self._in_use.add(conn)
+
+        return conn
+
+    def put(self, conn, broken=False):
+        """Return a connection to the pool.
+
+        Args:
+            conn: A connection previously returned by :meth:`acquire`.
+            broken (bool=False): If True, the connection is closed instead of being returned to the idle list.
+        """
+        with self._available:
+            self._in_use.discard(conn)
+            if broken or not conn.is_open():
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._available.notify()
+        self.reap()
+
+    def release(self, broken=False):
+        """Return the current thread's connection to the pool, if it has one.
+
+        Args:
+            broken (bool=False): If True, close the connection instead. The thread's next use of :attr:`connection`
+              checks out a fresh one.
+        """
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None:
+            self._local.connection = None
+            self.put(conn, broken=broken)
+
+    def reap(self):
+        """Close connections that have been idle longer than ``idle_timeout``, keeping at least ``min_size`` open."""
+        if self.idle_timeout is None:
+            return
+
+        cutoff = time.monotonic() - self.idle_timeout
+        reaped = []
+        with self._lock:
+            while self._idle and self.size > self.min_size and self._idle[0][1] < cutoff:
+                reaped.append(self._idle.popleft()[0])
+        for conn in reaped:
+            self._close(conn)
+        if reaped:
+            self.log.debug("Reaped {0} idle connections".format(len(reaped)))
+
+    def close(self):
+        """Close every idle connection in the pool."""
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for conn, _ in idle:
+            self._close(conn)
+
+    def _add_idle(self, conn):
+        with self._available:
+            if self.size < self.max_size:
+                self._idle.append((conn, time.monotonic()))
+                self._available.notify()
+                conn = None
+        if conn is not None:
+            self._close(conn)
+
+    def _close(self, conn):
+        try:
+            conn.close(noreply_wait=False)
+        except r.ReqlDriverError:
+            pass
+
+
+class ConnectionMonitor(threading.Thread):
+    """A daemon thread that periodically runs :meth:`ConnectionPool.check` on every pool in a suite.
+
+    Args:
+        suite (sondra.suite.Suite): The suite whose ``connections`` to monitor.
+        interval (float): Seconds between checks.
+    """
+    def __init__(self, suite, interval):
+        super(ConnectionMonitor, self).__init__(name="{0}-connection-monitor".format(suite.__class__.__name__),
+                                                daemon=True)
+        self.suite = suite
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            for name, pool in list(self.suite.connections.items()):
+                try:
+                    pool.check()
+                except Exception as e:
+                    self.suite.log.exception("Error checking connection '{0}': {1}".format(name, e))
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,134 @@
+"""Cross-process cache invalidation over RethinkDB changefeeds.
+
+Every process that caches documents (see ``Collection.cache_size``) only sees its own writes. The
+:class:`InvalidationBus` follows ``table.changes()`` on every watched collection and drops changed keys from the local
+caches as soon as any process, or anything else, writes to the table. It also sends the
+``sondra.collection.signals.invalidated`` signal so that other caches keyed on documents can follow along.
+"""
+import logging
+import threading
+
+import rethinkdb as r
+
+from sondra.collection import signals as collection_signals
+
+
+def _changed_keys(collection):
+    pk = collection.primary_key
+    return collection.table.changes().map(lambda change: {
+        'app': collection.application.slug,
+        'coll': collection.slug,
+        'key': r.branch(change['old_val'].eq(None), change['new_val'][pk], change['old_val'][pk]),
+    })
+
+
+class _Listener(threading.Thread):
+    """Follows the changefeeds of every watched collection on a single connection."""
+
+    def __init__(self, bus, connection_name):
+        super(_Listener, self).__init__(name="invalidation-{0}".format(connection_name), daemon=True)
+        self.bus = bus
+        self.connection_name = connection_name
+        self.collections = []
+        self.changed = threading.Event()
+
+    def watch(self, collection):
+        self.collections.append(collection)
+        self.changed.set()  # add the new table to the feed on the next poll
+
+    def follow(self, conn):
+        self.changed.clear()
+        feeds = [_changed_keys(c) for c in list(self.collections)]
+        return (r.union(*feeds) if len(feeds) > 1 else feeds[0]).run(conn)
+
+    def run(self):
+        pool = self.bus.suite.connections[self.connection_name]
+        reconnected = False
+        while not self.bus.stopped.is_set():
+            conn = None
+            try:
+                conn = pool.acquire()
+                cursor = self.follow(conn)
+
+                # anything could have changed while we weren't listening
+                if reconnected:
+                    self.bus.invalidate_all(self.collections)
+                reconnected = False
+
+                while not self.bus.stopped.is_set():
+                    if self.changed.is_set():
+                        # open the new feed before closing the old one, so no change falls between the two
+                        cursor, old = self.follow(conn), cursor
+                        old.close()
+                    try:
+                        change = cursor.next(wait=self.bus.poll_interval)
+                    except r.ReqlTimeoutError:
+                        continue
+                    self.bus.invalidate(change['app'], change['coll'], change['key'])
+
+                cursor.close()
+                pool.put(conn)
+            except (r.ReqlError, ConnectionError) as e:
+                self.bus.log.warning("Invalidation feed for '{0}' dropped: {1}".format(self.connection_name, e))
+                if conn is not None:
+                    pool.put(conn, broken=True)
+                reconnected = True
+                self.bus.stopped.wait(self.bus.reconnect_delay)
+
+
+class InvalidationBus(object):
+    """Broadcasts document changes to the caches of every process sharing a database.
+
+    One listener thread per connection follows the changefeeds of all the collections watched on that connection.
+    Collections with a cache call :meth:`watch` themselves when the suite has ``invalidation_feeds`` turned on.
+
+    Args:
+        suite (sondra.suite.Suite): The suite whose collections to watch.
+        poll_interval (float=1): Seconds a listener waits for a change before checking whether it should stop or
+          pick up newly watched collections.
+        reconnect_delay (float=5): Seconds to wait before re-establishing a dropped feed. Every watched cache is
+          cleared once the feed is back, since changes may have been missed.
+    """
+    def __init__(self, suite, poll_interval=1, reconnect_delay=5):
+        self.suite = suite
+        self.poll_interval = poll_interval
+        self.reconnect_delay = reconnect_delay
+        self.stopped = threading.Event()
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._listeners = {}
+        self._lock = threading.Lock()
+
+    def watch(self, collection):
+        """Start following changes to a collection's table."""
+        name = collection.application.connection_name
+        with self._lock:
+            listener = self._listeners.get(name)
+            if listener is None:
+                listener = self._listeners[name] = _Listener(self, name)
+                listener.watch(collection)
+                listener.start()
+            else:
+                listener.watch(collection)
+        self.log.info("Watching {0} for changes".format(collection.url))
+
+    def invalidate(self, app, coll, key):
+        """Drop a key from a collection's cache and tell anyone else listening."""
+        try:
+            collection = self.suite[app][coll]
+        except KeyError:
+            return
+
+        if collection.cache is not None:
+            collection.cache.invalidate(key)
+        collection_signals.invalidated.send(collection.__class__, instance=collection, key=key)
+
+    def invalidate_all(self, collections):
+        """Clear the caches of the given collections entirely."""
+        for collection in collections:
+            if collection.cache is not None:
+                collection.cache.clear()
+            collection_signals.invalidated.send(collection.__class__, instance=collection, key=None)
+
+    def stop(self):
+        """Stop every listener. They exit within ``poll_interval`` seconds."""
+        self.stopped.set()
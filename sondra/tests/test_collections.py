@@ -81,4 +81,354 @@ def test_abstract_collection(s):
 def test_collection_help(s):
     assert s['simple-app']['simple-documents'].help()
     assert s['simple-app']['simple-points'].help()
-    assert s['simple-app']['foreign-key-docs'].help()
\ No newline at end of file
+    assert s['simple-app']['foreign-key-docs'].help()
+
+def test_document_cache():
+    from sondra.collection.cache import DocumentCache
+
+    cache = DocumentCache(2, ttl=None)
+    assert cache.get('a') is None
+    cache.put('a', {'slug': 'a', 'nested': {'x': 1}})
+    cache.put('b', {'slug': 'b'})
+
+    row = cache.get('a')
+    row['nested']['x'] = 2
+    assert cache.get('a')['nested']['x'] == 1  # hits are copies
+
+    cache.put('c', {'slug': 'c'})  # evicts b, the least recently used
+    assert 'b' not in cache
+    assert 'a' in cache
+
+    cache.invalidate('a')
+    assert 'a' not in cache
+
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['evictions'] == 1
+    assert stats['invalidations'] == 1
+
+    expiring = DocumentCache(2, ttl=-1)
+    expiring.put('a', {'slug': 'a'})
+    assert 'a' not in expiring
+
+
+def test_clear_table_cache(s):
+    from sondra.collection.cache import DocumentCache
+
+    coll = s['simple-app']['simple-points']
+    coll.cache = DocumentCache(10)
+    try:
+        coll.cache.put('cached', {'slug': 'cached'})
+        coll.clear_table()
+        assert 'cached' not in coll.cache
+    finally:
+        coll.cache = None
+
+
+def test_query_caching(s):
+    from sondra.collection.cache import DocumentCache
+
+    coll = s['simple-app']['simple-documents']
+    doc = coll.create({'name': "Cached", 'value': 1})
+    coll.cache = DocumentCache(10)
+    try:
+        list(coll.q(coll.table.get_all(doc.id)))
+        assert doc.id not in coll.cache  # scans don't push out documents read by key
+
+        coll.cache_queries = True
+        list(coll.q(coll.table.get_all(doc.id)))
+        assert doc.id in coll.cache
+    finally:
+        coll.cache = None
+        coll.__dict__.pop('cache_queries', None)
+        doc.delete()
+
+
+def test_invalidation_bus(s):
+    """Writes from another connection drop cached rows, and watching another table doesn't clear the caches"""
+    import threading
+    import rethinkdb as r
+    from sondra.collection import signals as collection_signals
+    from sondra.collection.cache import DocumentCache
+    from sondra.suite.invalidation import InvalidationBus
+
+    coll = s['simple-app']['simple-documents']
+    other = s['simple-app']['simple-points']
+    doc = coll.create({'name': "Invalidated"})
+    conn = r.connect(**s.connection_config['default'])
+
+    seen = []
+    changed = threading.Event()
+    def invalidated(sender, instance=None, key=None):
+        seen.append((instance, key))
+        changed.set()
+    collection_signals.invalidated.connect(invalidated)
+
+    def write_until_seen(collection, key, value):
+        # the feed starts in the background, so keep writing until a change comes through
+        for _ in range(50):
+            changed.clear()
+            collection.table.get(key).update(value).run(conn)
+            if changed.wait(0.2):
+                return
+
+    coll.cache, other.cache = DocumentCache(10), DocumentCache(10)
+    bus = InvalidationBus(s, poll_interval=0.1)
+    try:
+        bus.watch(coll)
+        coll.cache.put(doc.id, {'slug': doc.id})
+        write_until_seen(coll, doc.id, {'name': "Changed elsewhere"})
+        assert (coll, doc.id) in seen
+        assert doc.id not in coll.cache
+
+        point = other.create({'name': "Watched later", 'geometry': {'type': "Point", 'coordinates': [0, 0]}})
+        try:
+            coll.cache.put(doc.id, {'slug': doc.id})
+            bus.watch(other)
+            write_until_seen(other, point.id, {'name': "Changed elsewhere"})
+            assert (other, point.id) in seen
+            assert doc.id in coll.cache
+            assert all(key is not None for _, key in seen)
+        finally:
+            point.delete()
+    finally:
+        bus.stop()
+        collection_signals.invalidated.disconnect(invalidated)
+        coll.cache = other.cache = None
+        conn.close()
+        doc.delete()
+
+def test_identity_map(s):
+    coll = s['simple-app']['simple-documents']
+    doc = coll.create({'name': "Identity Map"})
+    try:
+        assert coll[doc.id] is not coll[doc.id]  # no map outside a request
+
+        identity_map = s.open_identity_map()
+        assert s.identity_map is identity_map
+        first = coll[doc.id]
+        assert coll[doc.id] is first
+        assert coll.get_many([doc.id])[0] is first
+        assert identity_map.hits == 2
+
+        replacement = coll.doc({'slug': doc.id, 'name': "Identity Map"})
+        replacement.save()
+        assert coll[doc.id] is replacement
+
+        del coll[doc.id]
+        assert len(identity_map) == 0
+        with pytest.raises(KeyError):
+            coll[doc.id]
+    finally:
+        s.close_identity_map()
+        if doc.id in coll:
+            doc.delete()
+    assert s.identity_map is None
+
+
+def test_schema_validator(s):
+    import jsonschema
+
+    coll = s['simple-app']['simple-documents']
+    assert coll.schema_validator is coll.schema_validator  # compiled once
+
+    coll.schema_validator({'name': 'valid'})
+    with pytest.raises(jsonschema.ValidationError):
+        coll.schema_validator({'value': 0})  # name is required
+
+    method = coll.arg_test
+    assert s.method_request_validator(coll, method) is s.method_request_validator(coll, coll.arg_test)
+
+
+def test_schema_validator_draft_4():
+    import jsonschema
+    from sondra.validation import SchemaValidator
+
+    validator = SchemaValidator({'type': 'number', 'minimum': 0, 'exclusiveMinimum': True})
+    validator(1)
+    with pytest.raises(jsonschema.ValidationError):
+        validator(0)
+    assert '$schema' not in validator.schema  # the caller's schema is left alone
+
+
+def test_filter_planner(s):
+    from sondra.api.planner import FilterPlanner
+
+    coll = s['simple-app']['simple-documents']
+    planner = FilterPlanner(coll)
+
+    by_name = {'lhs': 'name', 'op': '==', 'rhs': 'x'}
+    by_value = {'lhs': 'value', 'op': '>', 'rhs': 0}
+    plan, rest = planner.plan([by_value, by_name])
+    assert plan.index == 'name' and plan.is_exact
+    assert rest == [by_value]
+
+    plan, rest = planner.plan([{'lhs': 'slug', 'rhs': 'x'}, by_name])
+    assert plan.is_primary
+
+    plan, rest = planner.plan([{'lhs': 'timestamp', 'op': '<', 'rhs': 'z'}])
+    assert plan.index == 'timestamp' and not plan.is_exact and not rest
+
+    plan, rest = planner.plan([dict(by_name, default=True)])
+    assert plan is None and len(rest) == 1
+
+    plan, rest = planner.plan([by_name], ordering_index='timestamp')
+    assert plan.index == 'name'  # the ordering index isn't used, so the filter's own index is
+
+    by_time = {'lhs': 'timestamp', 'op': '>', 'rhs': 'a'}
+    plan, rest = planner.plan([by_name, by_time], ordering_index='timestamp')
+    assert plan.index == 'timestamp' and rest == [by_name]  # preferred when the filter uses it
+
+    plan, rest = planner.plan([by_name], ordering_index='name')
+    assert plan.is_exact
+    assert plan.bounds() == ('x', 'x', 'closed', 'closed')  # so order_by(index=...) can follow it
+
+
+def test_patch(s):
+    import jsonschema
+    from datetime import datetime
+    from rethinkdb.ast import RqlQuery
+
+    coll = s['simple-app']['simple-documents']
+    doc = coll.create({'name': "Patched", 'value': 1})
+    try:
+        coll.patch(doc.id, {'value': 2})
+        assert coll[doc.id]['value'] == 2
+        assert coll[doc.id]['name'] == "Patched"
+
+        coll.patch_many([{'slug': doc.id, 'value': 3}])
+        assert coll[doc.id]['value'] == 3
+
+        with pytest.raises(jsonschema.ValidationError):
+            coll.patch(doc.id, {'value': 'not a number'})
+        with pytest.raises(jsonschema.ValidationError):
+            coll.patch_many([{'value': 4}])  # no primary key
+        with pytest.raises(KeyError):
+            coll.patch('not-a-key', {'value': 4})
+        with pytest.raises(KeyError):
+            coll.patch_many([{'slug': doc.id, 'value': 4}, {'slug': 'not-a-key', 'value': 4}])
+        assert coll[doc.id]['value'] == 3  # nothing was written
+    finally:
+        doc.delete()
+
+    term = coll.patch_term({'date': datetime(2020, 1, 1), 'value': 5})
+    assert term['value'] == 5
+    assert isinstance(term['date'], RqlQuery)  # converted for storage
+
+
+def test_patch_save_hooks(s):
+    from sondra.document import signals as doc_signals
+
+    coll = s['simple-app']['simple-documents']
+    processors = coll.document_class.processors
+    doc = coll.create({'name': "Hooked", 'value': 1})
+    saved = []
+    def post_save(sender, instance=None, **kwargs):
+        saved.append(instance)
+
+    try:
+        coll.document_class.processors = ()
+        assert not coll.has_save_hooks()
+        coll.patch(doc.id, {'value': 2})  # updated in place, which sends no signals
+        assert coll[doc.id]['value'] == 2
+        assert not saved
+
+        doc_signals.post_save.connect(post_save, sender=coll.document_class)
+        assert coll.has_save_hooks()
+        coll.patch(doc.id, {'value': 3})
+        assert [d['value'] for d in saved] == [3]
+    finally:
+        doc_signals.post_save.disconnect(post_save)
+        coll.document_class.processors = processors
+        doc.delete()
+
+def test_index_paging(s):
+    from sondra.api.query_set import QuerySet
+
+    coll = s['simple-app']['simple-documents']
+    qs = QuerySet(coll, paginate=True)
+    qs.get_query({})
+    assert (qs.ordering_index, qs.page_index) == ('slug', 'slug')
+
+    # without an ordering, pages follow the index that serves the filter instead of sorting in memory.
+    qs = QuerySet(coll, paginate=True)
+    qs.get_query({'flt': {'lhs': 'timestamp', 'op': '>', 'rhs': '2020-01-01'}})
+    assert (qs.ordering_index, qs.ordering_fields, qs.page_index) == ('timestamp', (), 'timestamp')
+
+    qs = QuerySet(coll, paginate=True)
+    qs.get_query({'flt': {'lhs': 'name', 'rhs': 'x'}})
+    assert (qs.ordering_index, qs.page_index) == ('name', 'name')
+
+    doc = coll.create({'name': "Paged", 'value': 1})
+    try:
+        token = qs.page_token(doc)
+        qs = QuerySet(coll, paginate=True)
+        qs.get_query({'flt': {'lhs': 'name', 'rhs': 'x'}, 'after': token})
+        assert qs.page_index == 'name'
+    finally:
+        doc.delete()
+
+
+def test_get_fields(s):
+    from sondra.api.ref import Reference
+
+    coll = s['simple-app']['simple-documents']
+    doc = coll.create({'name': "Plucked", 'value': 3})
+    try:
+        partial = coll.get_fields(doc.id, ['value'])
+        assert set(partial.obj) == {'slug', 'value'}
+        assert partial['value'] == 3
+        assert 'defaultValue' not in partial  # defaults aren't filled in on partial documents
+        with pytest.raises(KeyError):
+            coll.get_fields('not-a-key', ['value'])
+
+        ref = Reference(s, coll.url + '/' + doc.id + '@!/value')
+        d, parent, walk, value = ref.get_subdocument()
+        assert value == 3 and walk == ('value',)
+        assert 'name' not in d.obj
+    finally:
+        doc.delete()
+
+
+def test_index_ordering(s):
+    from sondra.api.query_set import QuerySet
+
+    coll = s['simple-app']['simple-documents']
+    assert coll.ordering() == (None, ())
+    try:
+        coll.order_by = ('name',)
+        assert coll.ordering() == (None, ('name',))  # off unless the collection asks for it
+
+        coll.index_order_by = True
+        assert coll.ordering() == ('name', ())  # the declared index
+
+        qs = QuerySet(coll, paginate=True)
+        qs.get_query({})
+        assert (qs.ordering_index, qs.page_index) == ('name', 'name')
+
+        qs = QuerySet(coll, paginate=True)
+        qs.get_query({'keys': '["a", "b"]'})  # order_by(index=...) can't follow get_all()
+        assert (qs.ordering_index, qs.ordering_fields) == (None, ('name',))
+
+        qs = QuerySet(coll, paginate=True)
+        qs.get_query({'flt': {'lhs': 'timestamp', 'op': '>', 'rhs': '2020-01-01'}})
+        assert qs.plan.index == 'timestamp'  # the filter's index, and the few results it finds are sorted in memory
+        assert (qs.ordering_index, qs.ordering_fields, qs.page_index) == (None, ('name',), None)
+
+        qs = QuerySet(coll, paginate=True)
+        qs.get_query({'flt': {'lhs': 'name', 'rhs': 'x'}})
+        assert qs.plan.index == 'name' and qs.plan.is_exact  # applied with between() on the ordering index
+        assert qs.page_index == 'name'
+
+        coll.order_by = ('value', 'name')
+        assert coll.ordering() == ('value_name', ())
+        assert coll.index_definitions()['value_name'] == ('value', 'name')
+        assert coll.index_fields()['value_name'] == ('value', 'name')
+
+        coll.index_order_by = False
+        assert coll.ordering() == (None, ('value', 'name'))
+        assert 'value_name' not in coll.index_definitions()
+    finally:
+        del coll.order_by
+        coll.__dict__.pop('index_order_by', None)
@@ -118,6 +118,58 @@ def test_document_update(s, simple_document):
     assert updated['value'] == 1024
 
 
+@pytest.fixture()
+def partial_updates(request):
+    SimpleDocument.partial_updates = True
+    request.addfinalizer(lambda: delattr(SimpleDocument, 'partial_updates'))
+
+
+def test_partial_save(s, simple_document, partial_updates):
+    coll = simple_document.collection
+    doc = coll[simple_document.id]
+    assert not doc.dirty
+
+    doc['value'] = 7
+    assert 'value' in doc.dirty
+    assert 'value' in doc.rql_changes()
+    assert 'name' not in doc.rql_changes()
+
+    ret = doc.save(return_changes=True)
+    assert ret['replaced'] == 1
+    assert not doc.dirty
+    assert doc.save()['unchanged'] == 1
+    assert coll[simple_document.id]['value'] == 7
+
+    coll.application.run(coll.table.get(simple_document.id).delete())  # deleted since it was loaded
+    doc['value'] = 8
+    ret = doc.save()
+    assert ret['inserted'] == 1 and not ret.get('skipped')
+    assert coll[simple_document.id]['value'] == 8
+    assert coll[simple_document.id]['name'] == "Document 1"
+
+
+def test_save_in_place_changes(s, simple_document):
+    coll = simple_document.collection
+    coll.application.run(coll.table.get(simple_document.id).update({'tags': ['a']}))
+
+    doc = coll[simple_document.id]
+    doc['tags'].append('b')  # changed in place, so never marked as set
+    doc.save()
+    assert coll[simple_document.id]['tags'] == ['a', 'b']
+
+
+def test_save_defaults_filled_on_load(s, simple_document, partial_updates):
+    coll = simple_document.collection
+    coll.application.run(coll.table.get(simple_document.id).replace(lambda row: row.without('defaultValue')))
+
+    doc = coll[simple_document.id]
+    assert doc['defaultValue'] == "Default Value 1"
+    assert 'defaultValue' in doc.dirty
+    doc.save()
+    stored = coll.application.run(coll.table.get(simple_document.id))
+    assert stored['defaultValue'] == "Default Value 1"
+
+
 def test_foreign_key_doc_creation(s, foreign_key_document):
     single = foreign_key_document.fetch('simple_document')
     multiple = foreign_key_document.fetch('rest')
@@ -130,6 +182,32 @@ def test_foreign_key_doc_creation(s, foreign_key_document):
     assert all([isinstance(x, SimpleDocument) for x in foreign_key_document['rest']])
 
 
+def test_converted_values_are_cached(s, foreign_key_document, simple_document):
+    single = foreign_key_document['simple_document']
+    assert foreign_key_document['simple_document'] is single
+    assert foreign_key_document['rest'] is foreign_key_document['rest']
+
+    foreign_key_document['simple_document'] = simple_document.id
+    assert foreign_key_document['simple_document'] is not single
+    assert foreign_key_document['simple_document'] == single
+
+    cached = foreign_key_document['simple_document']
+    foreign_key_document.clear_cache()
+    assert foreign_key_document['simple_document'] is not cached
+
+
+def test_prefetch_foreign_keys(s, foreign_key_document, simple_document):
+    from sondra.document.dereference import prefetch
+
+    coll = foreign_key_document.collection
+    docs = prefetch([coll[foreign_key_document.id], coll[foreign_key_document.id]])
+    for doc in docs:
+        assert set(doc._converted) == {'simple_document', 'rest'}
+        assert doc['simple_document'] == simple_document
+        assert [d.id for d in doc['rest']] == [simple_document.id] * 3
+    assert docs[0]['simple_document'] is docs[1]['simple_document']  # fetched once for both
+
+
 def test_simple_point_creation(s, simple_point):
     assert simple_point['geometry']
 
@@ -137,4 +215,229 @@ def test_simple_point_creation(s, simple_point):
 def test_document_help(s):
     assert s['simple-app']['simple-documents'].help()
     assert s['simple-app']['simple-points'].help()
-    assert s['simple-app']['foreign-key-docs'].help()
\ No newline at end of file
+    assert s['simple-app']['foreign-key-docs'].help()
+
+def test_get_many(s, simple_document, simple_point):
+    coll = s['simple-app']['simple-documents']
+    second = coll.create({'name': "Document 2"})
+    try:
+        docs = coll.get_many([second.id, 'not-a-key', simple_document.id])
+        assert [d.id for d in docs] == [second.id, simple_document.id]
+        assert all([isinstance(d, SimpleDocument) for d in docs])
+
+        with pytest.raises(KeyError):
+            coll.get_many([second.id, 'not-a-key'], missing='error')
+    finally:
+        second.delete()
+
+
+def test_collection_streaming(s, simple_document):
+    coll = s['simple-app']['simple-documents']
+    items = list(coll.items())
+    assert [k for k, _ in items] == list(coll)
+    assert all([isinstance(d, SimpleDocument) and d.id == k for k, d in items])
+    assert [d.id for d in coll.values()] == list(coll)
+
+    values = coll.values()
+    assert [d.id for d in values] == [d.id for d in values]  # views can be iterated again
+    assert len(values) == len(coll.items()) == len(coll)
+    assert coll.key_map() == {k: str(coll[k]) for k in coll}
+
+
+def test_document_from_db(s, simple_document, simple_point):
+    for doc in (simple_document, simple_point):
+        coll = doc.collection
+        row = coll.application.run(coll.table.get(doc.id))
+
+        loaded = coll.document_class.from_db(dict(row), coll)
+        constructed = coll.document_class(dict(row), collection=coll, from_db=True)
+        assert loaded.saved
+        assert loaded.obj == constructed.obj
+        assert loaded.url == constructed.url
+        assert loaded.json_repr() == constructed.json_repr()
+
+
+def test_repr_copies_only_converted_values(s, simple_point):
+    from copy import deepcopy
+
+    coll = simple_point.collection
+    point = coll.document_class.from_db(dict(coll.application.run(coll.table.get(simple_point.id))), coll)
+    before = deepcopy(point.obj)
+    js = point.json_repr()
+    point.rql_repr()
+    assert point.obj == before
+    assert '$reql_type$' not in js['geometry']
+
+    js['name'] = 'Changed'
+    assert point['name'] == 'A Point'
+
+    docs = s['simple-app']['simple-documents']
+    doc = docs.document_class({'name': "Nested", 'extra': {'values': list(range(100))}}, collection=docs)
+    assert doc.json_repr()['extra'] is doc.obj['extra']
+    assert doc.rql_repr()['extra'] is doc.obj['extra']
+
+
+def test_repr_allocations(s):
+    import tracemalloc
+    from copy import deepcopy
+
+    coll = s['simple-app']['simple-documents']
+    docs = [coll.document_class.from_db({
+        'slug': 'doc-{0}'.format(i),
+        'name': 'Doc {0}'.format(i),
+        'value': i,
+        'extra': {'values': list(range(50)), 'labels': {str(j): j for j in range(20)}},
+    }, coll) for i in range(200)]
+
+    def measure(repr):
+        tracemalloc.start()
+        reprs = [repr(doc) for doc in docs]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert len(reprs) == len(docs)
+        return size
+
+    copied = measure(lambda doc: deepcopy(doc.obj))  # what both reprs used to start from
+    assert measure(lambda doc: doc.json_repr()) < copied / 2
+    assert measure(lambda doc: doc.rql_repr()) < copied / 2
+
+def test_compiled_converters(s, simple_document):
+    from collections import OrderedDict
+    from sondra.document.converters import Converters
+    from sondra.document.schema_parser import SchemaParser
+
+    specials = SchemaParser({'type': 'object', 'properties': {
+        'when': {'type': 'string', 'format': 'date-time'},
+        'samples': {'type': 'array', 'items': {'type': 'object', 'properties': {
+            'when': {'type': 'string', 'format': 'date-time'}}}},
+        'days': {'type': 'object', 'patternProperties': {'^d_': {'type': 'string', 'format': 'date-time'}}},
+    }}, {})()
+    converters = Converters(specials)
+    obj = {
+        'name': 'Readings',
+        'when': '2020-01-01T00:00:00',
+        'samples': [{'when': '2020-01-02T00:00:00', 'value': 1}, {'value': 2}],
+        'days': {'d_1': '2020-01-03T00:00:00', 'other': 'x'},
+    }
+
+    expected = OrderedDict(obj)
+    for k, handler in specials.items():
+        expected[k] = handler.to_python_repr(obj[k], simple_document)
+    assert converters.python(obj, simple_document) == expected
+    assert isinstance(expected['days']['d_1'], datetime)
+    assert expected['days']['other'] == 'x'
+    assert converters.to_python['samples'](obj['samples'], simple_document) == expected['samples']
+
+    coll = simple_document.collection
+    assert coll.document_class.converters.specials is coll.document_class.specials
+    assert simple_document.json_repr()['date'] == simple_document.obj['date']
+
+
+def test_lazy_documents(s, simple_document):
+    from sondra.document.lazy import LazyDocument
+
+    coll = s['simple-app']['simple-documents']
+    lazy = next(coll.q(coll.table.get_all(simple_document.id), lazy=True))
+    assert isinstance(lazy, LazyDocument)
+    assert isinstance(lazy, document.Document)
+    assert lazy._document is None
+
+    eager = coll[simple_document.id]
+    assert lazy.url == eager.url
+    assert lazy['date'] == eager['date']
+    assert dict(lazy) == dict(eager)
+    assert lazy.json_repr() == eager.json_repr()
+    assert lazy._document is None  # none of that needed the full document
+
+    lazy['value'] = 5
+    assert lazy._document is not None
+    assert lazy.json_repr()['value'] == 5
+
+
+def test_processors_run_on_load(s):
+    from sondra.document.lazy import LazyDocument
+    from sondra.document.processors import DerivedProperty
+
+    class LabelledDocument(SimpleDocument):
+        processors = SimpleDocument.processors + (
+            DerivedProperty('label', ('name', 'value'), derivation=lambda props: '{name}:{value}'.format(**props)),
+        )
+
+    coll = s['simple-app']['simple-documents']
+    row = {'slug': 'saved-before', 'name': "Saved Before", 'value': 2}  # saved before the processor was added
+    doc = LabelledDocument.from_db(dict(row), coll)
+    assert doc['label'] == "Saved Before:2"  # derived on load, as the constructor always did
+    assert 'label' in doc.dirty
+
+    assert not LazyDocument.can_wrap_row(LabelledDocument, row)
+    assert LazyDocument.can_wrap_row(SimpleDocument, row)  # the slug is already there
+    assert not LazyDocument.can_wrap_row(SimpleDocument, {'name': "No Slug"})
+
+
+def test_save_lazy_documents(s):
+    coll = s['simple-app']['simple-documents']
+    doc = coll.create({'name': "Lazy", 'value': 1})
+    try:
+        lazy = next(coll.q(coll.table.get_all(doc.id), lazy=True))
+        lazy['value'] = 2
+        coll.save(lazy, conflict='replace', return_changes=True)
+        assert coll[doc.id]['value'] == 2
+
+        lazy = next(coll.q(coll.table.get_all(doc.id), lazy=True))
+        assert lazy.update(value=3) is lazy.document  # saves, instead of only changing the proxy
+        assert coll[doc.id]['value'] == 3
+        assert lazy['value'] == 3
+    finally:
+        doc.delete()
+
+
+def test_compact_documents(s):
+    import tracemalloc
+    from sondra.document.compact import CompactDocument
+
+    class CompactSimpleDocument(CompactDocument, SimpleDocument):
+        pass
+
+    coll = s['simple-app']['simple-documents']
+    rows = [{'slug': 'doc-{0}'.format(i), 'name': 'Doc {0}'.format(i), 'value': i} for i in range(1000)]
+
+    def measure(cls):
+        tracemalloc.start()
+        docs = [cls.from_db(dict(row), coll) for row in rows]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return docs, size
+
+    docs, size = measure(SimpleDocument)
+    compact_docs, compact_size = measure(CompactSimpleDocument)
+    assert compact_size < size
+
+    doc, compact = docs[0], compact_docs[0]
+    assert isinstance(compact, SimpleDocument)
+    assert dict(compact) == dict(doc)
+    assert dict(compact.json_repr()) == dict(doc.json_repr())
+    assert compact.metadata == {}
+
+    compact['value'] = 10
+    del compact['name']
+    assert compact['value'] == 10
+    assert 'name' not in compact
+    assert set(compact) == set(doc) - {'name'}
+
+
+def test_save_compact_documents(s):
+    from sondra.document.compact import CompactDocument
+
+    class CompactSimpleDocument(CompactDocument, SimpleDocument):
+        pass
+
+    coll = s['simple-app']['simple-documents']
+    doc = CompactSimpleDocument({'name': "Compact", 'value': 4}, collection=coll)
+    doc.validate()  # validators only take dicts as objects, so the document validates a copy
+    doc.save()
+    try:
+        stored = coll[doc.id]
+        assert stored['name'] == "Compact"
+        assert stored['value'] == 4
+    finally:
+        doc.delete()
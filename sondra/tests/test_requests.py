@@ -528,6 +528,109 @@ def test_flt__equals(docs):
     assert len(results) == 1  # should pick up the point at (0.0, 33.2) and (-10.1, 33.2)
 
 
+def test_pagination(docs):
+    simple_documents = _url('simple-app/simple-documents')
+
+    page = requests.get(simple_documents, params={"limit": 4})
+    assert page.ok
+    seen = [d['slug'] for d in page.json()]
+    assert len(seen) == 4
+
+    while 'next' in page.links:
+        assert 'after=' in page.links['next']['url']
+        page = requests.get(page.links['next']['url'])
+        assert page.ok
+        seen.extend(d['slug'] for d in page.json())
+
+    assert len(seen) == 10
+    assert seen == sorted(set(seen))  # ordered by primary key, with nothing repeated
+
+    assert requests.get(simple_documents, params={"after": "not a token"}).status_code == 400
+    assert requests.get(simple_documents, params={"limit": "many"}).status_code == 400
+    assert requests.get(simple_documents, params={"keys": '["doc-1"]', "after": "x"}).status_code == 400
+
+
+def test_streaming(docs):
+    simple_documents = _url('simple-app/simple-documents')
+
+    ndjson = requests.get(simple_documents + ';ndjson', stream=True)
+    assert ndjson.ok
+    assert ndjson.headers['Content-Type'].startswith('application/x-ndjson')
+    lines = [json.loads(line) for line in ndjson.iter_lines() if line]
+    assert len(lines) == 10
+
+    array = requests.get(simple_documents + ';json;stream=true')
+    assert array.ok
+    assert sorted(d['slug'] for d in array.json()) == sorted(d['slug'] for d in lines)
+
+    limited = requests.get(simple_documents + ';ndjson', params={'limit': 3})
+    assert limited.ok
+    assert len([line for line in limited.iter_lines() if line]) == 3
+
+
+def test_fields(docs):
+    simple_documents = _url('simple-app/simple-documents')
+
+    plucked = requests.get(simple_documents, params={'fields': 'name,value'})
+    assert plucked.ok
+    assert all(set(d) <= {'slug', 'name', 'value'} for d in plucked.json())
+    assert len(plucked.json()) == 10
+
+    without = requests.get(simple_documents, params={'without': 'defaultValue'})
+    assert without.ok
+    assert not any('defaultValue' in d for d in without.json())
+
+    assert requests.get(simple_documents, params={'fields': 'name', 'without': 'value'}).status_code == 400
+    assert requests.get(simple_documents, params={'fields': '["name"'}).status_code == 400
+
+
+def test_binary_formats(docs):
+    msgpack = pytest.importorskip('msgpack')
+    simple_documents = _url('simple-app/simple-documents')
+
+    packed = requests.get(simple_documents + ';msgpack')
+    assert packed.ok
+    assert packed.headers['Content-Type'].startswith('application/msgpack')
+    unpacked = msgpack.unpackb(packed.content, raw=False, timestamp=3)
+    assert sorted(d['slug'] for d in unpacked) == sorted(d['slug'] for d in docs.json())
+    assert all(isinstance(d['date'], datetime) for d in unpacked)
+    assert len(packed.content) < len(docs.content)
+
+    post = requests.post(simple_documents, data=msgpack.packb({'name': 'Packed Document', 'value': 11}),
+                         headers={'Content-Type': 'application/msgpack'})
+    assert post.ok
+    assert requests.get(_url('simple-app/simple-documents/packed-document')).json()['value'] == 11
+
+    bad = requests.post(simple_documents, data=b'\xc1', headers={'Content-Type': 'application/msgpack'})
+    assert bad.status_code == 400
+
+
+def test_columnar_formats(docs):
+    pa = pytest.importorskip('pyarrow')
+    import io
+    import pyarrow.parquet as pq
+    simple_documents = _url('simple-app/simple-documents')
+
+    stream = requests.get(simple_documents + ';arrow;batch_size=4')
+    assert stream.ok
+    assert stream.headers['Content-Type'].startswith('application/vnd.apache.arrow.stream')
+    batches = list(pa.ipc.open_stream(stream.content))
+    assert [batch.num_rows for batch in batches] == [4, 4, 2]
+    table = pa.Table.from_batches(batches)
+    assert table.num_rows == 10
+    assert pa.types.is_timestamp(table.schema.field('date').type)
+    assert pa.types.is_int64(table.schema.field('value').type)
+    assert sorted(table.column('value').to_pylist()) == list(range(10))
+
+    assert requests.get(simple_documents + ';arrow;batch_size=many').status_code == 400
+    assert requests.get(simple_documents + ';arrow;batch_size=0').status_code == 400
+    assert requests.get(_url('simple-app') + ';arrow').status_code == 400
+
+    parquet = requests.get(simple_documents + ';parquet')
+    assert parquet.ok
+    assert pq.read_table(io.BytesIO(parquet.content)).equals(table)
+
+
 def test_flt__gt(docs):
     simple_documents = _url('simple-app/simple-documents')
 
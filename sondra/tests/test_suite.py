@@ -52,4 +52,89 @@ def test_suite_schema(s):
 
 def test_help(s):
     """Make sure that the help method returns something, even in edge cases"""
-    assert isinstance(s.help(), str)
\ No newline at end of file
+    assert isinstance(s.help(), str)
+
+def test_connection_pool_per_thread(s):
+    """Each thread gets its own connection, and releasing returns it to the pool"""
+    import threading
+
+    pool = s.connections['default']
+    main_conn = s['simple-app'].connection
+    assert main_conn is s['simple-app'].connection
+
+    seen = []
+    def worker():
+        seen.append(s['simple-app'].connection)
+        s.release_connections()
+
+    t = threading.Thread(target=worker)
+    t.start()
+    t.join()
+
+    assert seen[0] is not main_conn
+    assert pool.in_use == 1
+    s.release_connections()
+    assert pool.in_use == 0
+    assert pool.size <= pool.max_size
+
+
+def test_connection_health(s):
+    """The background monitor's checks can also be run on demand"""
+    assert s.check_connections()
+    health = s.connection_health()
+    assert set(health) == set(s.connection_config)
+    assert all(h['healthy'] for h in health.values())
+    assert all(h['last_checked'] for h in health.values())
+
+
+def test_connection_retry(s):
+    """A query whose connection drops while it runs is retried once on a fresh connection"""
+    import rethinkdb as r
+
+    pool = s.connections['default']
+    calls = []
+    class DropsOnce(object):
+        def run(self, conn, **kwargs):
+            calls.append(conn)
+            if len(calls) == 1:
+                conn.close(noreply_wait=False)
+                raise r.ReqlDriverError("Connection is closed.")
+            return r.expr(1).run(conn, **kwargs)
+
+    assert pool.run(DropsOnce()) == 1
+    assert len(calls) == 2
+    assert calls[1] is not calls[0]
+    assert calls[1] is pool.connection
+    assert pool.healthy
+    s.release_connections()
+
+    class InsertDropsOnce(DropsOnce, r.ast.Insert):
+        pass
+
+    calls.clear()
+    with pytest.raises(r.ReqlDriverError):
+        pool.run(InsertDropsOnce())  # it may have been applied already, so it isn't sent again
+    assert len(calls) == 1
+    assert not pool.healthy
+    s.release_connections()
+    assert s.check_connections()
+
+
+def test_json_codecs(s):
+    import json
+    from collections import OrderedDict
+    from datetime import datetime
+    from sondra.codecs import JSON_CODECS, json_codec
+
+    assert s.json_codec.name == ('orjson' if 'orjson' in JSON_CODECS else 'json')
+
+    value = OrderedDict([('b', 1), ('a', [datetime(2020, 1, 2, 3, 4, 5)]), (3, None)])
+    for name in JSON_CODECS:
+        codec = json_codec(name)
+        encoded = codec.dumps(value, default=lambda o: o.isoformat())
+        assert json.loads(encoded) == {'b': 1, 'a': ['2020-01-02T03:04:05'], '3': None}
+        assert list(json.loads(encoded)) == ['b', 'a', '3']
+        assert codec.dumps({'a': 1}, indent=4) == json.dumps({'a': 1}, indent=4)
+        assert codec.loads(b'{"a": [1]}') == codec.loads('{"a": [1]}') == {'a': [1]}
+        with pytest.raises(ValueError):
+            codec.loads('{')
@@ -0,0 +1,72 @@
+"""Compiled JSON schema validators.
+
+Calling ``jsonschema.validate()`` checks the schema and builds a new validator every time. A :class:`SchemaValidator`
+is built once per schema and reused. If `fastjsonschema`_ is installed, schemas that don't refer to other URLs are
+compiled into Python code, which is considerably faster; everything else uses a cached ``jsonschema`` validator.
+
+.. _fastjsonschema: https://pypi.python.org/pypi/fastjsonschema
+"""
+import jsonschema
+
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
+DRAFT_4 = 'http://json-schema.org/draft-04/schema#'
+
+
+def _has_remote_refs(schema):
+    if isinstance(schema, dict):
+        ref = schema.get('$ref')
+        if isinstance(ref, str) and not ref.startswith('#'):
+            return True
+        return any(_has_remote_refs(v) for v in schema.values())
+    elif isinstance(schema, list):
+        return any(_has_remote_refs(v) for v in schema)
+    else:
+        return False
+
+
+class SchemaValidator(object):
+    """A JSON schema compiled once and reused for every instance it validates.
+
+    Formats are not checked and defaults are not filled in, matching ``jsonschema.validate()``.
+
+    Args:
+        schema (dict): A Draft 4 JSON schema. It is assumed to be valid already.
+
+    Attributes:
+        compiled (bool): True if the schema was compiled by fastjsonschema.
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self.compiled = False
+        self._validate = None
+
+        if fastjsonschema is not None and not _has_remote_refs(schema):
+            # fastjsonschema assumes draft 7 without $schema, which reads draft 4's boolean exclusiveMinimum and
+            # exclusiveMaximum differently.
+            draft_4 = dict(schema, **{'$schema': DRAFT_4})
+            try:
+                self._validate = fastjsonschema.compile(draft_4, use_default=False, use_formats=False)
+                self.compiled = True
+            except (TypeError, fastjsonschema.JsonSchemaDefinitionException):
+                pass  # older fastjsonschema, or something it can't handle. fall back on jsonschema.
+
+        if self._validate is None:
+            self._validate = jsonschema.Draft4Validator(schema).validate
+
+    def __call__(self, instance):
+        """Validate an instance.
+
+        Raises:
+            jsonschema.ValidationError if the instance doesn't conform to the schema.
+        """
+        if self.compiled:
+            try:
+                self._validate(instance)
+            except fastjsonschema.JsonSchemaValueException as e:
+                raise jsonschema.ValidationError(e.message)
+        else:
+            self._validate(instance)